@@ -1,116 +1,342 @@
 # cogs/calendar_cog.py
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
 import os
 import asyncio
-from datetime import datetime, timedelta, timezone, time
-import pytz 
-
-# ... (Google API Imports and other imports are the same) ...
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import re
+from time import monotonic
+from functools import lru_cache, partial
+from itertools import groupby
+from operator import itemgetter
+from datetime import date, datetime, timedelta, timezone, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# The Google API client (googleapiclient) is imported where it is used. It is slow to
+# import and isn't needed until the first calendar fetch.
 from utils.ui_helpers import create_embed, EmbedColors
 from utils.scheduler import Job
 
 log = logging.getLogger(__name__)
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 
+# Google returns event start times as RFC 3339 strings, e.g. 2025-08-04T09:30:00-04:00 or ...Z
+_RFC3339_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?(Z|[+-]\d{2}:\d{2})$')
+
+def _parse_rfc3339(value: str) -> datetime:
+    """Parses an RFC 3339 timestamp, falling back to datetime.fromisoformat for other shapes."""
+    match = _RFC3339_RE.match(value)
+    if not match:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    year, month, day, hour, minute, second, offset = match.groups()
+    if offset == 'Z':
+        tzinfo = timezone.utc
+    else:
+        sign = -1 if offset[0] == '-' else 1
+        tzinfo = timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6])))
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), tzinfo=tzinfo)
+
+@lru_cache(maxsize=64)
+def _get_zone(name: str):
+    """Returns the tzinfo for a zone name, built once per process."""
+    return timezone.utc if name == 'UTC' else ZoneInfo(name)
+
+def _is_authorized():
+    """A command check that only lets the bot's authorized user run the command."""
+    async def predicate(ctx: commands.Context) -> bool:
+        return ctx.author.id == ctx.bot.authorized_user_id
+    return commands.check(predicate)
+
 class CalendarAssistant:
     # --- NEW: Pass the local timezone into the assistant ---
     def __init__(self, calendars_to_check, local_timezone_str):
         self.calendars_to_check = [cal['summary'] for cal in calendars_to_check]
+        # Authenticate while the cog loads, so a missing or unusable token is dealt with at
+        # startup (where the browser prompt can be answered) instead of inside a background job.
+        # Only building the API client is deferred to first use (see _get_service).
         self.creds = self.authenticate()
+        self.service = None
+        self._http = None
         
         # --- NEW: Store the user's local timezone object ---
         try:
-            self.local_timezone = pytz.timezone(local_timezone_str)
+            self.local_timezone = _get_zone(local_timezone_str)
             log.info(f"Calendar assistant initialized with timezone: {self.local_timezone}")
-        except pytz.UnknownTimeZoneError:
+        except ZoneInfoNotFoundError:
             log.error(f"Unknown timezone '{local_timezone_str}'. Defaulting to UTC.")
-            self.local_timezone = pytz.utc
+            self.local_timezone = _get_zone('UTC')
+
+        # Today's events are cached briefly so back-to-back requests (e.g. the !today
+        # command and the scheduled job) don't each go back to Google.
+        self._ttl_seconds = 300
+        self._cache: tuple[tuple, float, list] | None = None # (key, fetched_at, events)
+        self._cache_lock = asyncio.Lock()
+        # (local date, timeMin, timeMax) for the most recent fetch, so the window is computed once a day.
+        self._day_window: tuple[date, str, str] | None = None
+
+        # The list of subscribed calendars rarely changes, so its summary -> id map is kept for a day.
+        self._calendar_id_map_ttl_seconds = 86400
+        self._calendar_id_map: dict[str, str] | None = None
+        self._calendar_id_map_ts: float = 0
 
     def authenticate(self):
-        # ... (this method is unchanged) ...
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
+        from google.auth.exceptions import RefreshError
+
         creds = None
         if os.path.exists('gtoken.json'):
             creds = Credentials.from_authorized_user_file('gtoken.json', SCOPES)
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
+                try:
+                    creds.refresh(Request())
+                except RefreshError:
+                    # The grant was revoked or has expired; only a new authorization can fix that.
+                    log.warning("Stored Google token could not be refreshed. Starting the authorization flow.")
+                    creds = None
+            if not creds or not creds.valid:
                 flow = InstalledAppFlow.from_client_secrets_file('gcredentials.json', SCOPES)
                 creds = flow.run_local_server(port=0)
-            with open('gtoken.json', 'w') as token:
-                token.write(creds.to_json())
+            self._save_token(creds)
         return creds
 
-    def fetch_todays_events(self) -> list:
-        """Fetches and processes today's events, correctly handling timezones."""
-        log.info("Fetching today's calendar events.")
-        service = build('calendar', 'v3', credentials=self.creds)
-        
-        # --- NEW: Get the start/end of the day in the user's local timezone ---
+    def _save_token(self, creds):
+        with open('gtoken.json', 'w') as token:
+            token.write(creds.to_json())
+
+    def refresh_credentials_if_expiring(self, margin: timedelta) -> bool:
+        """
+        Refreshes the Google credentials if they expire within `margin`.
+        Returns True if a refresh was performed.
+        """
+        if self.creds is None or not self.creds.refresh_token or self.creds.expiry is None:
+            return False
+        # google-auth stores the expiry as a naive UTC datetime.
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        if self.creds.expiry - now_utc > margin:
+            return False
+
+        from google.auth.transport.requests import Request
+        self.creds.refresh(Request())
+        self._save_token(self.creds)
+        log.info("Refreshed Google credentials ahead of expiry.")
+        return True
+
+    def _build_service(self):
+        """Builds the Calendar API client once so the discovery document isn't re-parsed on every fetch."""
+        from googleapiclient.discovery import build
+        from google_auth_httplib2 import AuthorizedHttp
+        import httplib2
+
+        # One shared connection pool, so repeated fetches reuse the open TLS connection to Google.
+        self.close()
+        self._http = httplib2.Http(timeout=30)
+        return build('calendar', 'v3', http=AuthorizedHttp(self.creds, http=self._http), cache_discovery=False)
+
+    def close(self):
+        """Closes the persistent connections held by the API client."""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def _get_service(self):
+        """Returns the Calendar API client, building it on first use."""
+        if self.service is None:
+            self.service = self._build_service()
+        return self.service
+
+    def _get_calendar_id_map(self, force_refresh: bool = False) -> dict[str, str]:
+        """Returns a map of calendar summary to calendar id, fetching it from Google only when stale."""
+        if (force_refresh or self._calendar_id_map is None or
+                monotonic() - self._calendar_id_map_ts >= self._calendar_id_map_ttl_seconds):
+            calendar_list = self._get_service().calendarList().list(fields='items(id,summary)').execute().get('items', [])
+            self._calendar_id_map = {c['summary']: c['id'] for c in calendar_list}
+            self._calendar_id_map_ts = monotonic()
+        return self._calendar_id_map
+
+    async def fetch_todays_events_async(self, force_refresh: bool = False) -> list:
+        """
+        Returns today's events, serving them from the in-memory cache when the
+        cached copy is for today's date and younger than the TTL.
+        Args:
+            force_refresh: If True, always fetch from Google and replace the cached copy.
+        """
+        from google.auth.exceptions import RefreshError
+
         now_local = datetime.now(self.local_timezone)
-        timeMin_local = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
-        timeMax_local = (now_local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        cache_key = (now_local.date(), tuple(self.calendars_to_check))
+
+        # The lock keeps concurrent callers from fetching the same data twice.
+        async with self._cache_lock:
+            if self._cache and not force_refresh:
+                key, fetched_at, events = self._cache
+                if key == cache_key and monotonic() - fetched_at < self._ttl_seconds:
+                    log.info("Serving today's calendar events from cache.")
+                    return events
+
+            try:
+                events = await self._fetch_events(now_local)
+            except RefreshError as e:
+                # Refreshing again would hit the same revoked grant, and the authorization flow
+                # needs someone at the browser, so this is reported rather than retried.
+                raise RuntimeError(
+                    "Google Calendar access has expired or been revoked. "
+                    "Restart the bot to re-authorize the calendar."
+                ) from e
+            self._cache = (cache_key, monotonic(), events)
+            return events
+
+    def _get_day_window(self, now_local: datetime) -> tuple[str, str]:
+        """Returns the UTC ISO timeMin/timeMax bounding the local day that contains now_local."""
+        if self._day_window and self._day_window[0] == now_local.date():
+            return self._day_window[1], self._day_window[2]
+
+        # --- NEW: Get the start/end of the day in the user's local timezone ---
+        timeMin_local = datetime.combine(now_local.date(), time.min, tzinfo=self.local_timezone)
+        timeMax_local = timeMin_local + timedelta(days=1)
 
         # Convert to UTC ISO format for the API call
-        timeMin = timeMin_local.astimezone(pytz.utc).isoformat()
-        timeMax = timeMax_local.astimezone(pytz.utc).isoformat()
+        timeMin = timeMin_local.astimezone(timezone.utc).isoformat()
+        timeMax = timeMax_local.astimezone(timezone.utc).isoformat()
+        self._day_window = (now_local.date(), timeMin, timeMax)
+        return timeMin, timeMax
 
-        events_today = []
-        calendar_list = service.calendarList().list().execute().get('items', [])
-        calendar_id_map = {c['summary']: c['id'] for c in calendar_list}
-        
+    def _get_targets(self) -> list[tuple[str, str]]:
+        """Returns (calendar name, calendar id) pairs for the configured calendars that exist."""
+        calendar_id_map = self._get_calendar_id_map()
+        if any(cal_name not in calendar_id_map for cal_name in self.calendars_to_check):
+            # The cached map may predate a newly added calendar, so refresh it once.
+            calendar_id_map = self._get_calendar_id_map(force_refresh=True)
+
+        targets = []
         for cal_name in self.calendars_to_check:
             cal_id = calendar_id_map.get(cal_name)
             if not cal_id:
                 log.warning(f"Could not find calendar ID for '{cal_name}'. Skipping.")
                 continue
+            targets.append((cal_name, cal_id))
+        return targets
+
+    async def _fetch_events(self, now_local: datetime) -> list:
+        """Fetches and processes today's events, correctly handling timezones."""
+        from googleapiclient.errors import HttpError
 
-            events_result = service.events().list(
-                calendarId=cal_id, timeMin=timeMin, timeMax=timeMax,
-                singleEvents=True, orderBy='startTime').execute()
-            
-            for event in events_result.get('items', []):
-                summary = event.get('summary', 'No Title')
-                start = event.get('start', {})
-                
-                if 'dateTime' in start:
-                    # --- THIS IS THE MAIN FIX ---
-                    # 1. Parse the datetime string from the API
-                    naive_dt = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
-
-                    # 2. Check if the datetime object is naive (has no tzinfo)
-                    if naive_dt.tzinfo is None or naive_dt.tzinfo.utcoffset(naive_dt) is None:
-                        # If it's naive, assume it's in the event's specified timezone (or UTC as a fallback)
-                        event_tz_str = event.get('timeZone', 'UTC')
-                        event_tz = pytz.timezone(event_tz_str)
-                        # Make the datetime "aware" by localizing it
-                        start_time_obj = event_tz.localize(naive_dt)
-                    else:
-                        # If it's already aware, just use it
-                        start_time_obj = naive_dt
-                    
-                    # 3. Convert the final "aware" object to the user's local timezone for display
-                    start_time_local = start_time_obj.astimezone(self.local_timezone)
-                    start_time_str = start_time_local.strftime('%I:%M %p')
-                else: # All-day event
-                    naive_date = datetime.fromisoformat(start['date'])
-                    start_time_obj = self.local_timezone.localize(naive_date)
-                    start_time_str = 'All-Day'
-                    
-                events_today.append({
-                    'calendar': cal_name, 
-                    'summary': summary, 
-                    'start_time': start_time_str,
-                    'sort_key': start_time_obj
-                })
+        log.info("Fetching today's calendar events.")
         
-        return sorted(events_today, key=lambda x: x['sort_key'])
+        timeMin, timeMax = self._get_day_window(now_local)
+
+        events_today = []
+        targets = await asyncio.to_thread(self._get_targets)
+        service = self._get_service()
+
+        # Send every events().list() call in a single multipart batch request instead of
+        # one round-trip per calendar. If the batch endpoint itself is rejected, fall back
+        # to one request per calendar, run concurrently on the thread pool.
+        try:
+            items_by_calendar = await asyncio.to_thread(self._fetch_events_batch, service, targets, timeMin, timeMax)
+        except HttpError as e:
+            log.warning(f"Batch request failed ({e}). Falling back to one request per calendar.")
+            results = await asyncio.gather(*(
+                asyncio.to_thread(self._fetch_one, cal_id, timeMin, timeMax) for _, cal_id in targets
+            ))
+            items_by_calendar = {cal_name: items for (cal_name, _), items in zip(targets, results)}
+
+        for cal_name, _ in targets:
+            for event in items_by_calendar.get(cal_name, []):
+                events_today.append(self._parse_event(cal_name, event))
+
+        events_today.sort(key=itemgetter('sort_key'))
+        return events_today
+
+    def _list_events(self, service, cal_id, timeMin, timeMax):
+        """Builds the events().list() request for a single calendar."""
+        return service.events().list(
+            calendarId=cal_id, timeMin=timeMin, timeMax=timeMax,
+            singleEvents=True, orderBy='startTime',
+            # Only the fields read by _parse_event; the full event resource is much larger.
+            fields='items(summary,start(dateTime,date,timeZone))')
+
+    def _fetch_one(self, cal_id, timeMin, timeMax) -> list:
+        """Fetches the raw event items for a single calendar."""
+        from google_auth_httplib2 import AuthorizedHttp
+        import httplib2
+
+        # httplib2 connections aren't thread-safe, so each concurrent request gets its own.
+        # The timeout matches the shared client's, so a hung fetch can't hold its thread forever.
+        raw_http = httplib2.Http(timeout=30)
+        try:
+            http = AuthorizedHttp(self.creds, http=raw_http)
+            return self._list_events(self.service, cal_id, timeMin, timeMax).execute(http=http).get('items', [])
+        finally:
+            raw_http.close()
+
+    def _fetch_events_batch(self, service, targets, timeMin, timeMax) -> dict:
+        """
+        Fetches the events for all target calendars with one batch request.
+        Returns a dict mapping each calendar name to its list of raw event items.
+        Calendars whose part of the batch failed are fetched again individually; if that
+        fails too the error propagates, so an incomplete agenda is never cached.
+        """
+        items_by_calendar = {}
+        if not targets:
+            return items_by_calendar
+
+        failed = []
+
+        def collect(cal_name, cal_id, request_id, response, exception):
+            if exception is not None:
+                log.warning(f"Batched fetch failed for '{cal_name}' ({exception}). Retrying it on its own.")
+                failed.append((cal_name, cal_id))
+                return
+            items_by_calendar[cal_name] = response.get('items', [])
+
+        batch = service.new_batch_http_request()
+        for cal_name, cal_id in targets:
+            batch.add(self._list_events(service, cal_id, timeMin, timeMax), callback=partial(collect, cal_name, cal_id))
+        batch.execute()
+
+        for cal_name, cal_id in failed:
+            items_by_calendar[cal_name] = self._fetch_one(cal_id, timeMin, timeMax)
+        return items_by_calendar
+
+    def _parse_event(self, cal_name, event) -> dict:
+        """Converts a raw API event into the dict used to build the agenda."""
+        summary = event.get('summary', 'No Title')
+        start = event.get('start', {})
+
+        if 'dateTime' in start:
+            # --- THIS IS THE MAIN FIX ---
+            # 1. Parse the datetime string from the API
+            naive_dt = _parse_rfc3339(start['dateTime'])
+
+            # 2. Check if the datetime object is naive (has no tzinfo)
+            if naive_dt.tzinfo is None or naive_dt.tzinfo.utcoffset(naive_dt) is None:
+                # If it's naive, assume it's in the event's specified timezone (or UTC as a fallback)
+                event_tz_str = start.get('timeZone', 'UTC')
+                event_tz = _get_zone(event_tz_str)
+                # Make the datetime "aware" by attaching the zone (zoneinfo handles DST without localize)
+                start_time_obj = naive_dt.replace(tzinfo=event_tz)
+            else:
+                # If it's already aware, just use it
+                start_time_obj = naive_dt
+
+            # 3. Convert the final "aware" object to the user's local timezone for display
+            start_time_local = start_time_obj.astimezone(self.local_timezone)
+            start_time_str = start_time_local.strftime('%I:%M %p')
+        else: # All-day event
+            naive_date = datetime.fromisoformat(start['date'])
+            start_time_obj = naive_date.replace(tzinfo=self.local_timezone)
+            start_time_str = 'All-Day'
+
+        return {
+            'calendar': cal_name,
+            'summary': summary,
+            'start_time': start_time_str,
+            # Epoch seconds, so sorting compares plain ints rather than aware datetimes.
+            'sort_key': int(start_time_obj.timestamp())
+        }
 
 
 class CalendarCog(commands.Cog):
@@ -128,29 +354,61 @@ class CalendarCog(commands.Cog):
             target_time=time(10, 25, tzinfo=timezone.utc),
             hours=24,
         )
-        self.bot.scheduler.add_job(calendar_job)
+        self._calendar_job = self.bot.scheduler.add_job(calendar_job)
+
+        # Keep the event cache warm so !today and the scheduled job rarely wait on Google.
+        self.refresh_events_cache.start()
+        # Refresh the access token before it expires so fetches never pay for it inline.
+        self.refresh_credentials.start()
+
+    def cog_unload(self):
+        """Stops this cog's jobs and closes its connections so a reload doesn't leave duplicates behind."""
+        self.bot.scheduler.remove_job(self._calendar_job)
+        self.refresh_events_cache.cancel()
+        self.refresh_credentials.cancel()
+        self.assistant.close()
+
+    async def cog_command_error(self, ctx: commands.Context, error: commands.CommandError):
+        """Ignores calls that fail a check, such as from an unauthorized user, and logs anything else."""
+        if isinstance(error, commands.CheckFailure):
+            return
+        # Defining this handler stops discord.py's default logging for the cog, so keep it here.
+        log.error(f"Error in command '{ctx.command}': {error}", exc_info=error)
+
+    @tasks.loop(minutes=4)
+    async def refresh_events_cache(self):
+        """Refetches today's events shortly before the cached copy expires."""
+        try:
+            await self.assistant.fetch_todays_events_async(force_refresh=True)
+        except Exception as e:
+            log.error(f"Background calendar refresh failed: {e}", exc_info=True)
+
+    @tasks.loop(minutes=10)
+    async def refresh_credentials(self):
+        """Proactively refreshes the Google access token when it is close to expiring."""
+        try:
+            await asyncio.to_thread(self.assistant.refresh_credentials_if_expiring, timedelta(minutes=10))
+        except Exception as e:
+            log.error(f"Background credential refresh failed: {e}", exc_info=True)
     
     # ... (the rest of the cog's methods like _build_today_response, get_todays_events, etc. are unchanged) ...
     async def _build_today_response(self) -> tuple[discord.Embed, discord.ui.View | None]:
-        events = await asyncio.to_thread(self.assistant.fetch_todays_events)
+        events = await self.assistant.fetch_todays_events_async()
         if not events:
             final_embed = create_embed("Today's Agenda", "🎉 You have no events scheduled for today. Enjoy the peace!", EmbedColors.SUCCESS)
         else:
             description_parts = []
-            current_calendar = None
-            for event in events:
-                if event['calendar'] != current_calendar:
-                    current_calendar = event['calendar']
-                    description_parts.append(f"\n**📅 {current_calendar}**")
-                description_parts.append(f"• `{event['start_time']}` - {event['summary']}")
+            # Events are sorted by time, so consecutive runs from the same calendar share a header.
+            for calendar_name, group in groupby(events, key=itemgetter('calendar')):
+                description_parts.append(f"\n**📅 {calendar_name}**")
+                description_parts.extend([f"• `{event['start_time']}` - {event['summary']}" for event in group])
             final_embed = create_embed("Today's Agenda", "\n".join(description_parts), EmbedColors.INFO)
         return (final_embed, None)
 
     @commands.command(name="today")
     @commands.dm_only()
+    @_is_authorized()
     async def get_todays_events(self, ctx: commands.Context):
-        if ctx.author.id != self.bot.authorized_user_id:
-            return
         try:
             thinking_embed = create_embed("Checking Calendars...", "Please wait while I fetch your schedule.", EmbedColors.INFO)
             message = await ctx.send(embed=thinking_embed)
@@ -1,5 +1,6 @@
 # cogs/llm_cog.py
 import discord
+from discord import DMChannel
 from discord.ext import commands
 import ollama
 import logging
@@ -8,17 +9,131 @@ import re
 import requests
 import base64
 import io
+import json
+from itertools import cycle
+from time import monotonic
 from datetime import datetime, date, time, timezone
 
+# orjson decodes the sandbox's base64 image payloads noticeably faster, but it is optional.
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
 from utils.discord_helpers import send_long_message
+from utils.math_helpers import try_direct_math
 from utils.ui_helpers import create_embed, ConfirmationView, EmbedColors
 from utils.database_manager import DatabaseManager
 from utils.task_agent import Agent as TaskAgent
-from utils.ui_helpers import TaskView
+from utils.ui_helpers import TaskView, TaskButton, MAX_TASK_BUTTONS
 from utils.scheduler import Job
 
 log = logging.getLogger(__name__)
 
+# Embed colors bound once at import for the cog's embed builders
+_C_SUCCESS = EmbedColors.SUCCESS
+_C_INFO = EmbedColors.INFO
+_C_ERROR = EmbedColors.ERROR
+_C_WARNING = EmbedColors.WARNING
+
+# Number of recent user/assistant exchanges kept in the conversation history (the system prompt is always kept).
+MAX_TURNS = 20
+# While streaming a response, the status message is edited every STREAM_EDIT_CHUNKS chunks
+# or STREAM_EDIT_SECONDS seconds, whichever comes first, to stay clear of Discord's rate limits.
+STREAM_EDIT_CHUNKS = 20
+STREAM_EDIT_SECONDS = 0.5
+# Progress updates during a tool-use turn are dropped if the status message was edited less than this long ago.
+STATUS_EDIT_SECONDS = 1.5
+# Database writes are queued and flushed together: the writer waits DB_FLUSH_SECONDS after the
+# first queued row and then writes up to DB_BATCH_SIZE rows with a single commit.
+DB_FLUSH_SECONDS = 0.05
+DB_BATCH_SIZE = 32
+# Longest part of a !t prompt copied into the task's notes
+MAX_NOTES_PROMPT_CHARS = 200
+# !history output longer than this is sent as a text file instead of chunked messages
+HISTORY_FILE_THRESHOLD = 6000
+
+# Markdown code fences in coder responses, compiled once
+_PYTHON_BLOCK_RE = re.compile(r'```python\s*(.+?)\s*```', re.DOTALL)
+_ANY_BLOCK_RE = re.compile(r'```\s*(.+?)\s*```', re.DOTALL)
+
+# --- NEW: Agentic System Prompt ---
+# This prompt teaches the LLM how to use its new code execution tool.
+SYSTEM_PROMPT = """
+        You are {botname}, a helpful assistant speaking with {username}.
+        You have access to a tool that can execute Python code in a secure sandbox.
+
+        When you need to perform a calculation, generate a plot, or access information via code, you MUST respond with the special tag [TOOL_USE] followed by a clear, one-sentence prompt for a specialist code generation model.
+
+        Example 1:
+        User: What is the square root of 256?
+        You: To answer that, I will calculate the square root of 256. [TOOL_USE] Generate Python code to calculate and print the square root of 256.
+
+        Example 2:
+        User: Plot the sine and cosine functions on the same graph.
+        You: I will generate a plot of both functions. [TOOL_USE] Generate Python code to plot sin(x) and cos(x) from -2*pi to 2*pi on the same graph, with a legend.
+
+        Do not write the code yourself. Only provide the [TOOL_USE] tag and the prompt for the coder model. If the user is just chatting, respond normally without using the tool.
+        """
+
+# Marks a reasoning response that asks for the code execution tool; see SYSTEM_PROMPT.
+_TOOL_TAG = "[TOOL_USE]"
+_TOOL_TAG_LEN = len(_TOOL_TAG)
+
+# Appended to every coder prompt; the coder is called with format='json' so only the script is generated.
+CODER_JSON_INSTRUCTION = 'Respond only with a JSON object of the form {"code": "<the complete Python script>"}. No prose.'
+
+# (label, column, fallback) for each line of the !view embed
+_TASK_DETAIL_FIELDS = (
+    ("Description", 'description', 'N/A'),
+    ("Status", 'status', 'N/A'),
+    ("Priority", 'priority', 'N/A'),
+    ("Due Date", 'due_date', 'N/A'),
+    ("Created On", 'creation_date', 'N/A'),
+    ("Completed On", 'date_completed', 'Not completed'),
+    ("Notes", 'notes', 'None'),
+)
+
+# A !t message made of two or more bulleted or numbered lines is stored as one task per line.
+_TASK_LIST_ITEM_RE = re.compile(r'\s*(?:[-*•]|\d+[.)])\s+(.+?)\s*')
+
+# The !clearhistory embeds never change, so they are built once and copied per use.
+_CLEAR_HISTORY_CONFIRM_EMBED = create_embed(
+    title="Confirm Action",
+    description="Are you sure you want to permanently clear the conversation history?",
+    color=_C_WARNING
+)
+_CLEAR_HISTORY_SUCCESS_EMBED = create_embed("Success", "Conversation history has been cleared.", _C_SUCCESS)
+_CLEAR_HISTORY_CANCELLED_EMBED = create_embed("Cancelled", "The action was cancelled.", _C_INFO)
+_CLEAR_HISTORY_TIMEOUT_EMBED = create_embed("Timed Out", "You did not respond in time.", _C_ERROR)
+
+def _log_generation_speed(model: str, response) -> None:
+    """Logs the decode speed Ollama reports for a finished response, for comparing models and quantizations."""
+    eval_count = response.get('eval_count')
+    eval_duration = response.get('eval_duration')
+    if eval_count and eval_duration:
+        log.info(f"Model '{model}' generated {eval_count} tokens at {eval_count / (eval_duration / 1e9):.1f} tokens/s.")
+
+def _timestamp() -> str:
+    """
+    Returns the current local time as a naive ISO 8601 string, the format existing message
+    and musing rows already use, so the timestamp column keeps sorting chronologically.
+    """
+    return datetime.now().isoformat()
+
+def _split_task_list(message: str) -> list[str]:
+    """Returns the items of a bulleted or numbered list, or an empty list if the message isn't one."""
+    lines = [line for line in message.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return []
+    items = []
+    for line in lines:
+        match = _TASK_LIST_ITEM_RE.fullmatch(line)
+        if not match:
+            return []
+        items.append(match.group(1))
+    return items
+
 class LLMCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -27,7 +142,29 @@ class LLMCog(commands.Cog):
         self.conversation_model = getattr(self.bot, 'conversation_model', 'gemma2:2b')
         self.coder_model = getattr(self.bot, 'coder_model', 'qwen2.5-coder:1.5b')
         self.sandbox_url = getattr(self.bot, 'sandbox_url', 'http://localhost:5000/execute')
+        # sandbox_url may list several sandbox containers; executions are spread across them round-robin.
+        sandbox_urls = [self.sandbox_url] if isinstance(self.sandbox_url, str) else list(self.sandbox_url)
+        self._sandbox_urls = cycle(sandbox_urls)
+        # One session for all sandbox requests. The sandbox's sync workers close each connection, so this
+        # doesn't save connection setup; it just avoids building a new session per execution.
+        self._sandbox_session = requests.Session()
+        self.ollama_client = ollama.AsyncClient()
+        # How long Ollama keeps a model loaded after a request; -1 pins it in memory.
+        self._keep_alive = getattr(self.bot, 'ollama_keep_alive', -1)
+        # on_message runs for every message the bot sees, so keep its guard values close at hand.
+        self._authorized_id = self.bot.authorized_user_id
+        self._prefix = self.bot.command_prefix
+        # One task agent for the cog's lifetime instead of one per !t
+        self.task_agent = TaskAgent(model_name=getattr(self.bot, 'task_model', self.bot.model), keep_alive=self._keep_alive)
+        # Ollama serves one generation at a time, so only one request is sent to it at once.
+        self._llm_sem = asyncio.Semaphore(1)
         
+        # Built once so every history reset starts with a byte-identical prompt, which keeps
+        # Ollama's prompt prefix cache valid.
+        self._system_message = {
+            'role': 'system',
+            'content': SYSTEM_PROMPT.format(botname=self.bot.botname, username=self.bot.username),
+        }
         # Each cog instance will have its own conversation history
         self.conversation_history = []
         self._initialize_history()
@@ -35,32 +172,57 @@ class LLMCog(commands.Cog):
         self.last_generated_code = None
         
         self.db = DatabaseManager(bot.db_filename)
+        self._db_queue = asyncio.Queue()
+        self._db_writer_task = None
+        self._warmup_task = None
         self.setup_scheduled_jobs()
 
+    async def cog_load(self):
+        # Task buttons dispatch by custom_id, so lists sent before a restart stay clickable.
+        self.bot.add_dynamic_items(TaskButton)
+        self._db_writer_task = asyncio.create_task(self._db_writer())
+        # Loading a model can take a while, so don't hold up the rest of startup for it.
+        self._warmup_task = asyncio.create_task(self._warm_models())
+
+    async def _warm_models(self):
+        """Loads the chat, coder and task models into Ollama so the first message doesn't wait on a model load."""
+        for model in dict.fromkeys([self.conversation_model, self.coder_model, self.task_agent.model_name]):
+            try:
+                async with self._llm_sem:
+                    if model == self.conversation_model:
+                        # Prefill the system prompt too, so the first message reuses its cached prefix.
+                        await self.ollama_client.chat(
+                            model=model, messages=[self._system_message], keep_alive=self._keep_alive,
+                            options={'num_predict': 1}
+                        )
+                    elif model == self.task_agent.model_name:
+                        await self.task_agent.warmup()
+                    else:
+                        # An empty message list just loads the model.
+                        await self.ollama_client.chat(model=model, messages=[], keep_alive=self._keep_alive)
+                log.info(f"Warmed up Ollama model '{model}'.")
+            except Exception as e:
+                log.warning(f"Could not warm up Ollama model '{model}': {e}")
+
     def _initialize_history(self):
         """Clears the history and adds the initial system prompt for the agent."""
         self.conversation_history.clear()
-        
-        # --- NEW: Agentic System Prompt ---
-        # This prompt teaches the LLM how to use its new code execution tool.
-        system_prompt = f"""
-        You are {self.bot.botname}, a helpful assistant speaking with {self.bot.username}.
-        You have access to a tool that can execute Python code in a secure sandbox.
-
-        When you need to perform a calculation, generate a plot, or access information via code, you MUST respond with the special tag [TOOL_USE] followed by a clear, one-sentence prompt for a specialist code generation model.
-
-        Example 1:
-        User: What is the square root of 256?
-        You: To answer that, I will calculate the square root of 256. [TOOL_USE] Generate Python code to calculate and print the square root of 256.
-
-        Example 2:
-        User: Plot the sine and cosine functions on the same graph.
-        You: I will generate a plot of both functions. [TOOL_USE] Generate Python code to plot sin(x) and cos(x) from -2*pi to 2*pi on the same graph, with a legend.
+        self.conversation_history.append(self._system_message)
+        log.info("LLM conversation history initialized with agentic prompt.")
 
-        Do not write the code yourself. Only provide the [TOOL_USE] tag and the prompt for the coder model. If the user is just chatting, respond normally without using the tool.
+    def _trim_history(self):
         """
-        self.conversation_history.append({'role': 'system', 'content': system_prompt})
-        log.info("LLM conversation history initialized with agentic prompt.")
+        Drops the oldest messages so at most MAX_TURNS exchanges follow the system prompt.
+        Keeping the system prompt pinned at the front preserves Ollama's prompt prefix cache.
+        The cut is moved forward to a user message, so the history never starts mid-exchange.
+        """
+        history = self.conversation_history
+        max_messages = MAX_TURNS * 2
+        if len(history) > max_messages + 1:
+            start = len(history) - max_messages
+            while start < len(history) and history[start]['role'] != 'user':
+                start += 1
+            del history[1:start]
 
     def setup_scheduled_jobs(self):
         """Initializes and adds all scheduled jobs for this cog."""
@@ -71,18 +233,155 @@ class LLMCog(commands.Cog):
             target_time=time(10, 30, tzinfo=timezone.utc),
             hours=24
         )
-        self.bot.scheduler.add_job(task_job)
+        self._task_job = self.bot.scheduler.add_job(task_job)
+
+    async def cog_unload(self):
+        """Removes this cog's scheduled jobs and flushes pending writes so a reload doesn't leave anything behind."""
+        self.bot.scheduler.remove_job(self._task_job)
+        self.bot.remove_dynamic_items(TaskButton)
+        if self._warmup_task:
+            self._warmup_task.cancel()
+        if self._db_writer_task:
+            self._db_writer_task.cancel()
+            # Let the writer store the batch it is holding before the queue is flushed.
+            await asyncio.gather(self._db_writer_task, return_exceptions=True)
+        self._flush_db_queue()
+        self._sandbox_session.close()
+
+    def _queue_db_write(self, table: str, record: dict):
+        """Queues a record to be inserted by the background database writer."""
+        self._db_queue.put_nowait((table, record))
+
+    async def _db_writer(self):
+        """Background task that batches queued database writes into a single commit."""
+        while True:
+            rows = [await self._db_queue.get()]
+            try:
+                await asyncio.sleep(DB_FLUSH_SECONDS)
+            except asyncio.CancelledError:
+                # These rows are already off the queue, so _flush_db_queue won't see them.
+                self.db.store_bulk(rows)
+                raise
+            while len(rows) < DB_BATCH_SIZE and not self._db_queue.empty():
+                rows.append(self._db_queue.get_nowait())
+            try:
+                await asyncio.to_thread(self.db.store_bulk, rows)
+            except Exception as e:
+                log.error(f"Failed to write {len(rows)} queued record(s) to the database: {e}", exc_info=True)
+
+    def _flush_db_queue(self):
+        """Synchronously writes anything still waiting in the database queue."""
+        rows = []
+        while not self._db_queue.empty():
+            rows.append(self._db_queue.get_nowait())
+        if rows:
+            self.db.store_bulk(rows)
+
+    async def _stream_chat(self, model: str, messages: list, status_message: discord.Message, stop_at_tool_prompt: bool = False) -> str:
+        """
+        Streams a chat response from Ollama, editing `status_message` with the text received so far.
+        Returns the complete response text.
+
+        With `stop_at_tool_prompt`, generation is cut off once a [TOOL_USE] tag has been followed by a
+        complete line, since only that one-sentence prompt is used and the coder can start sooner.
+        """
+        parts = []
+        pending_chunks = 0
+        last_edit = monotonic()
+        show_progress = True
+        tail = ""  # end of the text so far, long enough to spot a tag split across chunks
+        tool_prompt = None  # text after the tag, once it has been seen
+        chunk = {}
+        async with self._llm_sem:
+            stream = await self.ollama_client.chat(model=model, messages=messages, stream=True, keep_alive=self._keep_alive)
+            async for chunk in stream:
+                piece = chunk['message']['content']
+                parts.append(piece)
+                if stop_at_tool_prompt:
+                    if tool_prompt is None:
+                        window = tail + piece
+                        tag_index = window.find(_TOOL_TAG)
+                        if tag_index >= 0:
+                            tool_prompt = window[tag_index + _TOOL_TAG_LEN:]
+                        tail = window[-_TOOL_TAG_LEN:]
+                    else:
+                        tool_prompt += piece
+                    if tool_prompt is not None and "\n" in tool_prompt.lstrip():
+                        # Drop whatever followed the prompt line and stop generating.
+                        extra = len(tool_prompt.lstrip().partition("\n")[2]) + 1
+                        parts = ["".join(parts)[:-extra]]
+                        await stream.aclose()
+                        break
+                pending_chunks += 1
+                if show_progress and (pending_chunks >= STREAM_EDIT_CHUNKS or monotonic() - last_edit > STREAM_EDIT_SECONDS):
+                    content = "".join(parts)
+                    # A tool request isn't meant for the user, and Discord caps a message at 2000 characters.
+                    if _TOOL_TAG in content or len(content) > 2000:
+                        show_progress = False
+                        continue
+                    await status_message.edit(content=content)
+                    pending_chunks = 0
+                    last_edit = monotonic()
+        # The final chunk carries the generation stats (absent if generation was cut off).
+        _log_generation_speed(model, chunk)
+        return "".join(parts)
+
+    async def _answer_directly(self, message: discord.Message, answer: str):
+        """Sends a reply that needed no model call, recording both sides of the exchange as usual."""
+        received_at = _timestamp()
+        self.conversation_history.append({'role': 'user', 'content': message.content})
+        self.conversation_history.append({'role': 'assistant', 'content': answer})
+        self._trim_history()
+        self._queue_db_write('messages', {'author': self.bot.username, 'timestamp': received_at, 'message': message.content})
+        self._queue_db_write('messages', {'author': self.bot.botname, 'timestamp': _timestamp(), 'message': answer})
+        await message.channel.send(answer)
+
+    async def _update_status(self, status_message: discord.Message, content: str, last_edit: float) -> float:
+        """
+        Shows a progress update unless the status message was edited within STATUS_EDIT_SECONDS,
+        so quick steps don't each cost a Discord API call. Returns the time of the latest edit.
+        """
+        if monotonic() - last_edit < STATUS_EDIT_SECONDS:
+            return last_edit
+        await status_message.edit(content=content)
+        return monotonic()
+
+    async def _finish_response(self, status_message: discord.Message, text: str, file: discord.File | None = None):
+        """Replaces the status message with the final response, continuing in new messages if it is too long."""
+        await status_message.edit(content=text[:2000], attachments=[file] if file else [])
+        if len(text) > 2000:
+            await send_long_message(status_message.channel, text[2000:])
 
     # --- NEW: Helper method to extract code ---
     def _extract_python_code(self, text: str) -> str:
         """Extracts Python code from markdown code blocks."""
-        match = re.search(r'```python\s*([\s\S]+?)\s*```', text)
+        match = _PYTHON_BLOCK_RE.search(text)
         if match: return match.group(1).strip()
-        match = re.search(r'```\s*([\s\S]+?)\s*```', text)
+        match = _ANY_BLOCK_RE.search(text)
         if match: return match.group(1).strip()
         # As a fallback, if no markdown is present, assume the whole response is code.
         return text.strip()
 
+    async def _generate_code(self, prompt: str) -> str:
+        """
+        Asks the coder model for a script. The response is constrained to a JSON object with a
+        single "code" field, so no prose is generated; markdown extraction is kept as a fallback.
+        """
+        async with self._llm_sem:
+            coder_response = await self.ollama_client.chat(
+                model=self.coder_model,
+                messages=[{'role': 'user', 'content': f'{prompt}\n\n{CODER_JSON_INSTRUCTION}'}],
+                format='json',
+                keep_alive=self._keep_alive
+            )
+        _log_generation_speed(self.coder_model, coder_response)
+        content = coder_response['message']['content']
+        try:
+            return json.loads(content)['code'].strip()
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            log.warning("Coder response was not the expected JSON object; extracting code from markdown instead.")
+            return self._extract_python_code(content)
+
     # --- NEW: Helper method to run code in the sandbox ---
     async def _execute_code_in_sandbox(self, code_string: str):
         """Sends code to the Docker sandbox and returns the result."""
@@ -91,65 +390,82 @@ class LLMCog(commands.Cog):
             # requests is a blocking library, so we run it in a separate thread
             # to avoid freezing the entire bot.
             response = await asyncio.to_thread(
-                requests.post,
-                self.sandbox_url,
+                self._sandbox_session.post,
+                next(self._sandbox_urls),
                 json={"code": code_string},
                 timeout=30
             )
             response.raise_for_status()
-            return response.json()
+            return _json_loads(response.content)
         except requests.exceptions.RequestException as e:
             log.error(f"API Error connecting to sandbox: {e}")
             return {"stdout": "", "stderr": f"API Error: Could not connect to the sandbox.\n{e}", "image_b64": None}
+        except ValueError as e:
+            # json and orjson decode errors both subclass ValueError.
+            log.error(f"Sandbox returned a malformed response: {e}")
+            return {"stdout": "", "stderr": f"API Error: The sandbox returned a malformed response.\n{e}", "image_b64": None}
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """The listener for messages, now with agentic tool-use logic."""
-        if (message.author.bot or
-            not isinstance(message.channel, discord.DMChannel) or
-            message.author.id != self.bot.authorized_user_id or
-            message.content.startswith(self.bot.command_prefix)):
+        # Most messages are from someone else, so the id comparison goes first.
+        if (message.author.id != self._authorized_id or
+            type(message.channel) is not DMChannel or
+            message.author.bot or
+            message.content.startswith(self._prefix)):
             return
 
-        thinking_message = await message.channel.send("🤔 Thinking...")
-        
+        thinking_message = None
         try:
+            # Plain arithmetic is answered directly, skipping the models and the sandbox entirely.
+            math_result = try_direct_math(message.content)
+            if math_result is not None:
+                log.info(f"Answered '{message.content}' directly as arithmetic.")
+                await self._answer_directly(message, f"{message.content.strip()} = {math_result}")
+                return
+
+            if self._llm_sem.locked():
+                thinking_message = await message.channel.send("⏳ Waiting for the model to finish another request...")
+            else:
+                thinking_message = await message.channel.send("🤔 Thinking...")
+
+            # Timestamps are taken when each message is recorded.
+            received_at = _timestamp()
+
             # Add user message to history and DB
             self.conversation_history.append({'role': 'user', 'content': message.content})
-            self.db.store_message({'author': self.bot.username, 'timestamp': datetime.now().isoformat(), 'message': message.content})
+            self._trim_history()
+            self._queue_db_write('messages', {'author': self.bot.username, 'timestamp': received_at, 'message': message.content})
 
             # === REASONING STEP ===
             # Ask the conversational LLM what to do.
-            response = await asyncio.to_thread(
-                ollama.chat, model=self.conversation_model, messages=self.conversation_history
+            assistant_response = await self._stream_chat(
+                self.conversation_model, self.conversation_history, thinking_message, stop_at_tool_prompt=True
             )
-            assistant_response = response['message']['content']
 
             # === DECISION STEP: Check for tool use ===
-            if "[TOOL_USE]" not in assistant_response:
+            # One scan finds the tag; the code prompt is whatever follows the last one.
+            tag_index = assistant_response.rfind(_TOOL_TAG)
+            if tag_index < 0:
                 # No tool needed, just a normal chat response
                 self.conversation_history.append({'role': 'assistant', 'content': assistant_response})
-                self.db.store_message({'author': self.bot.botname, 'timestamp': datetime.now().isoformat(), 'message': assistant_response})
-                await thinking_message.edit(content=assistant_response)
+                self._trim_history()
+                self._queue_db_write('messages', {'author': self.bot.botname, 'timestamp': _timestamp(), 'message': assistant_response})
+                await self._finish_response(thinking_message, assistant_response)
                 return
 
             # === TOOL USE PATH ===
             log.info("LLM decided to use the code execution tool.")
-            await thinking_message.edit(content="✅ Decision: Use Code Execution Tool. Generating code...")
+            status_edited_at = await self._update_status(thinking_message, "✅ Decision: Use Code Execution Tool. Generating code...", 0.0)
             
             # 1. Generate Code
-            code_prompt = assistant_response.split("[TOOL_USE]")[-1].strip()
-            coder_response = await asyncio.to_thread(
-                ollama.chat,
-                model=self.coder_model,
-                messages=[{'role': 'user', 'content': f'Generate only the Python code for this prompt, without any explanation: {code_prompt}'}]
-            )
-            generated_code = self._extract_python_code(coder_response['message']['content'])
+            code_prompt = assistant_response[tag_index + _TOOL_TAG_LEN:].strip()
+            generated_code = await self._generate_code(f'Generate the Python code for this prompt: {code_prompt}')
             
             # 2. Execute Code (with error-correction loop)
             max_retries = 2
             for i in range(max_retries):
-                await thinking_message.edit(content=f"⚙️ Attempt {i+1}: Executing generated code...")
+                status_edited_at = await self._update_status(thinking_message, f"⚙️ Attempt {i+1}: Executing generated code...", status_edited_at)
                 execution_result = await self._execute_code_in_sandbox(generated_code)
 
                 if not execution_result['stderr']:
@@ -158,19 +474,16 @@ class LLMCog(commands.Cog):
 
                 log.warning(f"Code execution failed. Stderr: {execution_result['stderr']}")
                 if i < max_retries - 1:
-                    await thinking_message.edit(content=f"⚠️ Code failed. Attempting to fix (Attempt {i+2})...")
-                    correction_prompt = f"The following Python code failed with an error. Please fix it and provide only the complete, corrected script.\n\nCODE:\n{generated_code}\n\nERROR:\n{execution_result['stderr']}"
-                    coder_response = await asyncio.to_thread(
-                        ollama.chat, model=self.coder_model, messages=[{'role': 'user', 'content': correction_prompt}]
-                    )
-                    generated_code = self._extract_python_code(coder_response['message']['content'])
+                    status_edited_at = await self._update_status(thinking_message, f"⚠️ Code failed. Attempting to fix (Attempt {i+2})...", status_edited_at)
+                    correction_prompt = f"The following Python code failed with an error. Please fix it and provide the complete, corrected script.\n\nCODE:\n{generated_code}\n\nERROR:\n{execution_result['stderr']}"
+                    generated_code = await self._generate_code(correction_prompt)
                 else:
                     log.error("Max retries reached. Could not fix the code.")
             # Save generated code
             self.last_generated_code = generated_code
             
             # 3. Summarize Result
-            await thinking_message.edit(content="📝 Summarizing results...")
+            await self._update_status(thinking_message, "📝 Summarizing results...", status_edited_at)
             tool_output = f"[TOOL_RESULT]\nSTDOUT:\n{execution_result['stdout']}\nSTDERR:\n{execution_result['stderr']}"
             
             # Update history for the final summary
@@ -184,14 +497,14 @@ class LLMCog(commands.Cog):
                 """
             #self.conversation_history.append({'role': 'user', 'content': summarizer_prompt})
             
-            final_response = await asyncio.to_thread(
-                ollama.chat, model=self.conversation_model, messages=[{'role':'user', 'content':summarizer_prompt}]
+            final_message = await self._stream_chat(
+                self.conversation_model, [{'role':'user', 'content':summarizer_prompt}], thinking_message
             )
-            final_message = final_response['message']['content']
             
             # 4. Send Final Response to Discord
             self.conversation_history.append({'role': 'assistant', 'content': final_message})
-            self.db.store_message({'author': self.bot.botname, 'timestamp': datetime.now().isoformat(), 'message': f"[Agent Output]\n{final_message}"})
+            self._trim_history()
+            self._queue_db_write('messages', {'author': self.bot.botname, 'timestamp': _timestamp(), 'message': f"[Agent Output]\n{final_message}"})
 
             # Prepare file if an image was created
             discord_file = None
@@ -199,17 +512,17 @@ class LLMCog(commands.Cog):
                 log.info("Image data found in sandbox response.")
                 image_data = base64.b64decode(execution_result['image_b64'])
                 image_buffer = io.BytesIO(image_data)
-                discord_file = discord.File(image_buffer, filename="result.png")
+                discord_file = discord.File(image_buffer, filename=f"result.{execution_result.get('image_format') or 'png'}")
 
-            if discord_file:
-                await thinking_message.edit(content=final_message, attachments=[discord_file])
-            else:
-                await thinking_message.edit(content=final_message)
+            await self._finish_response(thinking_message, final_message, discord_file)
 
         except Exception as e:
             error_message = f"Sorry, a critical error occurred in the agentic loop: {e}"
             log.error(error_message, exc_info=True)
-            await thinking_message.edit(content=error_message)
+            if thinking_message:
+                await thinking_message.edit(content=error_message)
+            else:
+                await message.channel.send(error_message)
 
 
     # --- ALL OTHER COMMANDS (!history, !m, !t, !tasks) remain unchanged ---
@@ -221,30 +534,38 @@ class LLMCog(commands.Cog):
         if not self.conversation_history:
             await ctx.send("History is empty.")
             return
-        history_str = "\n".join([f"**{msg['role']}**: {msg['content']}" for msg in self.conversation_history])
-        await send_long_message(ctx.channel, f"--- Conversation History ---\n{history_str}")
+        buffer = io.StringIO()
+        buffer.write("--- Conversation History ---")
+        for msg in self.conversation_history:
+            buffer.write("\n**")
+            buffer.write(msg['role'])
+            buffer.write("**: ")
+            buffer.write(msg['content'])
+        history_str = buffer.getvalue()
+
+        # Long histories go out as one attachment rather than many 2000-character messages.
+        if len(history_str) > HISTORY_FILE_THRESHOLD:
+            history_file = discord.File(io.BytesIO(history_str.encode('utf-8')), filename="history.txt")
+            await ctx.send("--- Conversation History ---", file=history_file)
+        else:
+            await send_long_message(ctx.channel, history_str)
 
     @commands.command(name="clearhistory")
     @commands.dm_only()
     async def clear_llm_history(self, ctx: commands.Context):
         """Asks for confirmation before clearing the LLM conversation history."""
         view = ConfirmationView(author=ctx.author, confirm_label="Nuke it!", cancel_label="i don't wanna")
-        embed = create_embed(
-            title="Confirm Action",
-            description="Are you sure you want to permanently clear the conversation history?",
-            color=EmbedColors.WARNING
-        )
-        view.message = await ctx.send(embed=embed, view=view)
+        view.message = await ctx.send(embed=_CLEAR_HISTORY_CONFIRM_EMBED.copy(), view=view)
         await view.wait()
 
         if view.value is True:
             self._initialize_history()
-            final_embed = create_embed("Success", "Conversation history has been cleared.", EmbedColors.SUCCESS)
+            final_embed = _CLEAR_HISTORY_SUCCESS_EMBED.copy()
 
         elif view.value is False:
-            final_embed = create_embed("Cancelled", "The action was cancelled.", EmbedColors.INFO)
+            final_embed = _CLEAR_HISTORY_CANCELLED_EMBED.copy()
         else:
-            final_embed = create_embed("Timed Out", "You did not respond in time.", EmbedColors.ERROR)
+            final_embed = _CLEAR_HISTORY_TIMEOUT_EMBED.copy()
 
         await view.message.edit(embed=final_embed, view=None)
 
@@ -253,7 +574,7 @@ class LLMCog(commands.Cog):
     async def m(self, ctx: commands.Context, *, message): #Note JN-66 uses m(self, ctx, *, message)
         """Stores the user's thoughts in the musing database"""
         # Add database logic
-        self.db.store_musing({'timestamp':datetime.now().isoformat(), 'musing': message})
+        self._queue_db_write('musings', {'timestamp': _timestamp(), 'musing': message})
         await ctx.send("I have stored your thoughts. 💭")
 
     @commands.command()
@@ -261,21 +582,25 @@ class LLMCog(commands.Cog):
     async def t(self, ctx: commands.Context, *, message: str):
         """
         Uses an LLM to parse a message into a structured task and stores it.
+        A bulleted or numbered list is stored as one task per item.
         """
         try:
-            processing_embed = create_embed("Processing Task...", "Your request is being analyzed. Please wait.", EmbedColors.INFO)
+            processing_embed = create_embed("Processing Task...", "Your request is being analyzed. Please wait.", _C_INFO)
             response_message = await ctx.send(embed=processing_embed)
-            
-            # --- The task_agent now uses the improved version ---
-            task_agent = TaskAgent(model_name=self.bot.model)
-            task_data = await asyncio.to_thread(task_agent.process_task, message)
-            
-            task_data['creation_date'] = datetime.now().isoformat()
-            task_data['status'] = 'pending'
-            task_data['notes'] = f"Original prompt: '{message}'"
+
+            items = _split_task_list(message)
+            if items:
+                await self._store_task_list(response_message, items)
+                return
+
+            async with self._llm_sem:
+                task_data = await self.task_agent.process_task(message)
+
+            self._fill_new_task(task_data, message)
 
             # --- MODIFIED: Store the task and get its ID back ---
-            task_id = self.db.store_task(task_data)
+            # The confirmation needs the new ID, so this write can't go through the queue.
+            task_id = await asyncio.to_thread(self.db.store_task, task_data)
             log.info(f"Task stored successfully (ID: {task_id}): {task_data['description']}")
 
             # --- MODIFIED: Create a confirmation embed that includes the Task ID ---
@@ -287,7 +612,7 @@ class LLMCog(commands.Cog):
                     f"**Priority:** {task_data['priority']}\n"
                     f"**Due Date:** {task_data['due_date']}"
                 ),
-                color=EmbedColors.SUCCESS,
+                color=_C_SUCCESS,
 
             )
 
@@ -298,13 +623,45 @@ class LLMCog(commands.Cog):
             error_embed = create_embed(
                 "Error Processing Task",
                 f"An unexpected error occurred: {e}\n\nPlease try again.",
-                EmbedColors.ERROR
+                _C_ERROR
             )
             if 'response_message' in locals():
                 await response_message.edit(embed=error_embed)
             else:
                 await ctx.send(embed=error_embed)
 
+    def _fill_new_task(self, task_data: dict, prompt: str):
+        """Adds the bookkeeping fields a parsed task needs before it is stored."""
+        task_data['creation_date'] = datetime.now().isoformat()
+        task_data['status'] = 'pending'
+        prompt_excerpt = prompt if len(prompt) <= MAX_NOTES_PROMPT_CHARS else prompt[:MAX_NOTES_PROMPT_CHARS] + "…"
+        task_data['notes'] = f"Original prompt: '{prompt_excerpt}'"
+
+    async def _store_task_list(self, response_message: discord.Message, items: list[str]):
+        """Parses a list of tasks with one model call and stores each one."""
+        async with self._llm_sem:
+            results = await self.task_agent.process_tasks_bulk(items)
+
+        lines = []
+        stored = 0
+        for item, task_data in zip(items, results):
+            if isinstance(task_data, Exception):
+                log.warning(f"Could not parse task '{item}': {task_data}")
+                lines.append(f"❌ Could not parse: {item}")
+                continue
+            self._fill_new_task(task_data, item)
+            task_id = await asyncio.to_thread(self.db.store_task, task_data)
+            stored += 1
+            log.info(f"Task stored successfully (ID: {task_id}): {task_data['description']}")
+            lines.append(f"**{task_id}** · {task_data['description']} · {task_data['priority']} · due {task_data['due_date']}")
+
+        confirm_embed = create_embed(
+            title=f"✅ Stored {stored} of {len(items)} Tasks",
+            description="\n".join(lines),
+            color=_C_SUCCESS if stored == len(items) else _C_WARNING,
+        )
+        await response_message.edit(embed=confirm_embed)
+
     @commands.command(name="edit")
     @commands.dm_only()
     async def edit_task(self, ctx: commands.Context, task_id: int, *, new_description: str):
@@ -316,7 +673,7 @@ class LLMCog(commands.Cog):
             # Check if the task exists first
             existing_task = self.db.fetch_tasks(criteria={'task_id': task_id})
             if not existing_task:
-                embed = create_embed("Error", f"No task found with ID `{task_id}`.", EmbedColors.ERROR)
+                embed = create_embed("Error", f"No task found with ID `{task_id}`.", _C_ERROR)
                 await ctx.send(embed=embed)
                 return
 
@@ -329,7 +686,7 @@ class LLMCog(commands.Cog):
             embed = create_embed(
                 "Task Updated",
                 f"Successfully updated the description for Task ID `{task_id}`.",
-                EmbedColors.SUCCESS
+                _C_SUCCESS
             )
             await ctx.send(embed=embed)
 
@@ -337,7 +694,7 @@ class LLMCog(commands.Cog):
             await ctx.send("Invalid Task ID. Please provide a number.")
         except Exception as e:
             log.error(f"Error in !edit command: {e}", exc_info=True)
-            error_embed = create_embed("Error", f"An unexpected error occurred: {e}", EmbedColors.ERROR)
+            error_embed = create_embed("Error", f"An unexpected error occurred: {e}", _C_ERROR)
             await ctx.send(embed=error_embed)
             
     @commands.command(name="delete")
@@ -350,18 +707,18 @@ class LLMCog(commands.Cog):
         embed = create_embed(
             title="Confirm task deletion",
             description="Are you sure you want to delete this task?",
-            color=EmbedColors.WARNING
+            color=_C_WARNING
         )
         view.message = await ctx.send(embed=embed, view=view)
         await view.wait()
 
         if view.value is True:
             self.db.delete_task(task_id=task_id)
-            final_embed = create_embed("Success", "Task has been removed.", EmbedColors.SUCCESS)
+            final_embed = create_embed("Success", "Task has been removed.", _C_SUCCESS)
         elif view.value is False:
-            final_embed = create_embed("Cancelled", "Not deleting the task", EmbedColors.INFO)
+            final_embed = create_embed("Cancelled", "Not deleting the task", _C_INFO)
         else:
-            final_embed = create_embed("Timed Out", "You did not respond in time.", EmbedColors.ERROR)
+            final_embed = create_embed("Timed Out", "You did not respond in time.", _C_ERROR)
 
         await view.message.edit(embed=final_embed, view=None)
 
@@ -373,27 +730,22 @@ class LLMCog(commands.Cog):
         Returns:
             A tuple containing the (embed, view). The view will be None if there are no tasks.
         """
-        today_iso = date.today().isoformat()
-        criteria = {'due_date': ('<=', today_iso), 'status': 'pending'}
-        tasks_to_show = self.db.fetch_tasks(criteria)
+        # The database filters, flags overdue tasks and sorts by due date then priority.
+        tasks_to_show = self.db.fetch_due_tasks(date.today().isoformat())
 
         if not tasks_to_show:
-            embed = create_embed("Tasks", "🎉 No pending tasks due today or earlier!", EmbedColors.SUCCESS)
+            embed = create_embed("Tasks", "🎉 No pending tasks due today or earlier!", _C_SUCCESS)
             return embed, None # Return the embed and None for the view
 
-        # Flag and sort tasks
-        today = date.today()
-        for task in tasks_to_show:
-            task['is_overdue'] = date.fromisoformat(task['due_date']) < today
-            
-        priority_map = {'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
-        tasks_to_show.sort(key=lambda x: (x['due_date'], priority_map.get(x['priority'], 4)))
-
         # Build the response components
+        footer = None
+        if len(tasks_to_show) > MAX_TASK_BUTTONS:
+            footer = f"Showing the first {MAX_TASK_BUTTONS} of {len(tasks_to_show)} tasks."
         embed = create_embed(
             "Pending & Overdue Tasks",
             "Here are your tasks. Click a task to mark it as complete. **Overdue tasks are in ALL CAPS.**",
-            EmbedColors.INFO
+            _C_INFO,
+            footer_text=footer
         )
         view = TaskView(tasks=tasks_to_show, db_manager=self.db)
         
@@ -410,7 +762,7 @@ class LLMCog(commands.Cog):
             await ctx.send(embed=embed, view=view)
         except Exception as e:
             log.error(f"An error occurred in the !tasks command: {e}", exc_info=True)
-            error_embed = create_embed("Error", f"An unexpected error occurred while fetching tasks: {e}", EmbedColors.ERROR)
+            error_embed = create_embed("Error", f"An unexpected error occurred while fetching tasks: {e}", _C_ERROR)
             await ctx.send(embed=error_embed)
 
     async def scheduled_tasks_task(self, target: discord.User):
@@ -421,7 +773,7 @@ class LLMCog(commands.Cog):
             await target.send(embed=embed, view=view)
         except Exception as e:
             log.error(f"Error in scheduled 'tasks' job: {e}", exc_info=True)
-            await target.send(embed=create_embed("Error", "Sorry, an error occurred while fetching your daily tasks.", EmbedColors.ERROR))
+            await target.send(embed=create_embed("Error", "Sorry, an error occurred while fetching your daily tasks.", _C_ERROR))
 
     @commands.command(name="view")
     @commands.dm_only()
@@ -430,31 +782,26 @@ class LLMCog(commands.Cog):
         try:
             task = self.db.fetch_tasks(criteria={'task_id': task_id})
             if not task:
-                embed = create_embed("Error", f"No task found with ID `{task_id}`.", EmbedColors.ERROR)
+                embed = create_embed("Error", f"No task found with ID `{task_id}`.", _C_ERROR)
                 await ctx.send(embed=embed)
                 return
 
-            task_details = task[0] # fetch_tasks returns a list
+            task_details = dict(task[0]) # fetch_tasks returns a list of rows; copy so fields can be reformatted
             
-            # Safely format the creation date
-            creation_date_str = task_details.get('creation_date', 'N/A')
-            if 'T' in creation_date_str:
-                creation_date_str = creation_date_str.split('T')[0]
-
-            description = (
-                f"**Description:** {task_details.get('description', 'N/A')}\n"
-                f"**Status:** {task_details.get('status', 'N/A').capitalize()}\n"
-                f"**Priority:** {task_details.get('priority', 'N/A')}\n"
-                f"**Due Date:** {task_details.get('due_date', 'N/A')}\n"
-                f"**Created On:** {creation_date_str}\n"
-                f"**Completed On:** {task_details.get('date_completed') or 'Not completed'}\n"
-                f"**Notes:** {task_details.get('notes') or 'None'}\n"
+            # Show only the date part of the creation timestamp, and a capitalized status
+            if task_details.get('creation_date'):
+                task_details['creation_date'] = task_details['creation_date'].partition('T')[0]
+            if task_details.get('status'):
+                task_details['status'] = task_details['status'].capitalize()
+
+            description = "\n".join(
+                f"**{label}:** {task_details.get(key) or default}" for label, key, default in _TASK_DETAIL_FIELDS
             )
 
             embed = create_embed(
                 title=f"📋 Task Details (ID: {task_id})",
                 description=description,
-                color=EmbedColors.INFO
+                color=_C_INFO
             )
             await ctx.send(embed=embed)
 
@@ -462,7 +809,7 @@ class LLMCog(commands.Cog):
             await ctx.send("Invalid Task ID. Please provide a number.")
         except Exception as e:
             log.error(f"Error in !view command: {e}", exc_info=True)
-            error_embed = create_embed("Error", f"An unexpected error occurred: {e}", EmbedColors.ERROR)
+            error_embed = create_embed("Error", f"An unexpected error occurred: {e}", _C_ERROR)
             await ctx.send(embed=error_embed)
 
     @commands.command(name="edit")
@@ -476,7 +823,7 @@ class LLMCog(commands.Cog):
             # Check if the task exists first
             existing_task = self.db.fetch_tasks(criteria={'task_id': task_id})
             if not existing_task:
-                embed = create_embed("Error", f"No task found with ID `{task_id}`.", EmbedColors.ERROR)
+                embed = create_embed("Error", f"No task found with ID `{task_id}`.", _C_ERROR)
                 await ctx.send(embed=embed)
                 return
 
@@ -494,7 +841,7 @@ class LLMCog(commands.Cog):
                     value = value.strip()
                     
                     if key not in valid_fields:
-                        await ctx.send(embed=create_embed("Error", f"Invalid field: `{key}`. You can only edit: {', '.join(valid_fields)}", EmbedColors.ERROR))
+                        await ctx.send(embed=create_embed("Error", f"Invalid field: `{key}`. You can only edit: {', '.join(valid_fields)}", _C_ERROR))
                         return
                     # Allow setting a field to empty
                     if value.lower() in ['none', 'null', '']:
@@ -502,11 +849,11 @@ class LLMCog(commands.Cog):
                     else:
                         update_dict[key] = value
             except ValueError as ve:
-                 await ctx.send(embed=create_embed("Error", f"Could not parse your updates. {ve}", EmbedColors.ERROR))
+                 await ctx.send(embed=create_embed("Error", f"Could not parse your updates. {ve}", _C_ERROR))
                  return
 
             if not update_dict:
-                await ctx.send(embed=create_embed("Error", "No valid updates were provided.", EmbedColors.ERROR))
+                await ctx.send(embed=create_embed("Error", "No valid updates were provided.", _C_ERROR))
                 return
 
             # Update the task in the database
@@ -518,7 +865,7 @@ class LLMCog(commands.Cog):
             embed = create_embed(
                 "✅ Task Updated",
                 f"Successfully updated Task ID `{task_id}` with the following changes:\n{updated_fields_str}",
-                EmbedColors.SUCCESS
+                _C_SUCCESS
             )
             await ctx.send(embed=embed)
 
@@ -526,7 +873,7 @@ class LLMCog(commands.Cog):
             await ctx.send("Invalid Task ID. Please provide a number.")
         except Exception as e:
             log.error(f"Error in !edit command: {e}", exc_info=True)
-            error_embed = create_embed("Error", f"An unexpected error occurred: {e}", EmbedColors.ERROR)
+            error_embed = create_embed("Error", f"An unexpected error occurred: {e}", _C_ERROR)
             await ctx.send(embed=error_embed)
 
     @commands.command(name="lastcode")
@@ -534,7 +881,7 @@ class LLMCog(commands.Cog):
     async def last_code(self, ctx: commands.Context):
         """Displays the last Python code block generated by the tool."""
         if not self.last_generated_code:
-            embed = create_embed("No Code Found", "The code execution tool has not been used yet.", EmbedColors.INFO)
+            embed = create_embed("No Code Found", "The code execution tool has not been used yet.", _C_INFO)
             await ctx.send(embed=embed)
             return
 
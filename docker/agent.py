@@ -5,7 +5,6 @@ import json
 import re
 import base64
 from PIL import Image
-import io
 import os
 import readline
 
@@ -13,6 +12,43 @@ import readline
 CONVERSATION_MODEL = 'gemma2:2b'
 CODE_MODEL = 'qwen2.5-coder:1.5b'
 SANDBOX_URL = 'http://localhost:5000/execute'
+# Keeps both models (and the cached system-prompt prefix) loaded between turns
+KEEP_ALIVE = -1
+# Messages kept after the system prompt; older ones are dropped so each turn's prompt stays bounded
+MAX_HISTORY_MESSAGES = 40
+# One session for the whole run. The sandbox closes each connection after responding, so this
+# only saves building a session per request, not connection setup.
+SANDBOX_SESSION = requests.Session()
+
+# Markdown code fences in coder responses, compiled once
+PYTHON_BLOCK_RE = re.compile(r'```python\s*(.+?)\s*```', re.DOTALL)
+ANY_BLOCK_RE = re.compile(r'```\s*(.+?)\s*```', re.DOTALL)
+
+# Coder prompts simple enough to answer with a template instead of a model call.
+# Each entry maps a pattern on the coder prompt to a function building the script from the match.
+# A pattern must match the whole prompt (apart from a lead-in such as "calculate the"), so a
+# prompt asking for anything more goes to the coder model instead of losing the rest of its request.
+_NUMBER = r'(-?\d+(?:\.\d+)?)'
+_LEAD_IN = r'(?:(?:please\s+)?(?:calculate|compute|find|print|what is|what\'s)\s+)?(?:the\s+)?'
+_TRAIL = r'\s*[.?!]?'
+QUICK_PATTERNS = [
+    (re.compile(rf'{_LEAD_IN}square root of {_NUMBER}{_TRAIL}', re.IGNORECASE),
+     lambda m: f"import math\nprint(math.sqrt({m.group(1)}))"),
+    (re.compile(rf'{_LEAD_IN}cube root of {_NUMBER}{_TRAIL}', re.IGNORECASE),
+     lambda m: f"import numpy as np\nprint(np.cbrt({m.group(1)}))"),
+    (re.compile(rf'{_LEAD_IN}{_NUMBER} (?:raised )?to the power of {_NUMBER}{_TRAIL}', re.IGNORECASE),
+     lambda m: f"print({m.group(1)} ** {m.group(2)})"),
+    (re.compile(rf'{_LEAD_IN}factorial of (\d+){_TRAIL}', re.IGNORECASE),
+     lambda m: f"import math\nprint(math.factorial({m.group(1)}))"),
+]
+
+def quick_code(code_prompt: str) -> str | None:
+    """Returns a ready-made script for a recognised coder prompt, or None if the coder model is needed."""
+    for pattern, build in QUICK_PATTERNS:
+        match = pattern.fullmatch(code_prompt.strip())
+        if match:
+            return build(match)
+    return None
 
 class Colors:
     GREEN = '\033[92m'
@@ -29,52 +65,99 @@ def print_colored(text, color, bold=False):
 def execute_code_in_sandbox(code_string: str):
     print_colored("\n[Executing code in sandbox...]", Colors.YELLOW)
     try:
-        response = requests.post(SANDBOX_URL, json={"code": code_string}, timeout=30)
+        response = SANDBOX_SESSION.post(SANDBOX_URL, json={"code": code_string}, timeout=30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         return {"stdout": "", "stderr": f"API Error: {e}", "image_b64": None}
 
-def display_image_from_b64(b64_string: str):
+def display_image_from_b64(b64_string: str, image_format: str = "png"):
     try:
-        image_data = base64.b64decode(b64_string)
-        image = Image.open(io.BytesIO(image_data))
-        image_path = "llm_plot_output.png"
-        image.save(image_path)
+        # The sandbox already sends an encoded image file, so write its bytes as-is instead of
+        # decoding and re-encoding them with PIL.
+        image_path = f"llm_plot_output.{image_format}"
+        with open(image_path, 'wb') as f:
+            f.write(base64.b64decode(b64_string))
         print_colored(f"[Image saved to {image_path}]", Colors.GREEN)
-        image.show()
+        Image.open(image_path).show()
     except Exception as e:
         print_colored(f"Could not display image: {e}", Colors.RED)
 
+def stream_chat(model: str, messages: list, stop_at_tool_prompt: bool = False) -> str:
+    """
+    Prints a chat response as it is generated and returns the full text. With stop_at_tool_prompt,
+    generation stops once the line after a [TOOL_USE] tag is complete, since nothing after it is used.
+    """
+    parts = []
+    tail = ""  # last few characters, so a tag split across chunks is still found
+    tool_prompt = None
+    stream = ollama.chat(model=model, messages=messages, stream=True, keep_alive=KEEP_ALIVE)
+    for chunk in stream:
+        piece = chunk['message']['content']
+        parts.append(piece)
+        print(piece, end='', flush=True)
+        if not stop_at_tool_prompt:
+            continue
+        if tool_prompt is None:
+            window = tail + piece
+            tag_index = window.find("[TOOL_USE]")
+            if tag_index >= 0:
+                tool_prompt = window[tag_index + len("[TOOL_USE]"):]
+            tail = window[-len("[TOOL_USE]"):]
+        else:
+            tool_prompt += piece
+        if tool_prompt is not None and "\n" in tool_prompt.lstrip():
+            stream.close()
+            break
+    print()
+    return "".join(parts)
+
+def trim_history(conversation_history: list):
+    """
+    Drops the oldest messages, keeping the system prompt pinned at the front so its cached prefix stays valid.
+    The cut is moved forward to a user message, so the history never starts mid-exchange.
+    """
+    if len(conversation_history) > MAX_HISTORY_MESSAGES + 1:
+        start = len(conversation_history) - MAX_HISTORY_MESSAGES
+        while start < len(conversation_history) and conversation_history[start]['role'] != 'user':
+            start += 1
+        del conversation_history[1:start]
+
 def extract_python_code(text: str) -> str:
-    match = re.search(r'```python\s*([\s\S]+?)\s*```', text)
+    match = PYTHON_BLOCK_RE.search(text)
     if match: return match.group(1).strip()
-    match = re.search(r'```\s*([\s\S]+?)\s*```', text)
+    match = ANY_BLOCK_RE.search(text)
     if match: return match.group(1).strip()
     return text.strip()
 
 # --- The Agent's "Brain" (UPDATED) ---
 def run_agentic_loop(user_prompt, conversation_history):
     conversation_history.append({'role': 'user', 'content': user_prompt})
+    trim_history(conversation_history)
     
     # === REASONING STEP ===
     print_colored("\n[Thinking...]", Colors.BLUE)
-    response = ollama.chat(model=CONVERSATION_MODEL, messages=conversation_history, stream=False)
-    assistant_response = response['message']['content']
+    print_colored("\nJN-66:", Colors.GREEN, bold=True)
+    assistant_response = stream_chat(CONVERSATION_MODEL, conversation_history, stop_at_tool_prompt=True)
 
     if "[TOOL_USE]" in assistant_response:
         print_colored("[Decision: Use Code Execution Tool]", Colors.YELLOW, bold=True)
         
         # --- CODE GENERATION STEP ---
-        code_prompt = assistant_response.split("[TOOL_USE]")[-1].strip()
+        code_prompt = assistant_response.split("[TOOL_USE]")[-1].strip().partition("\n")[0]
         print_colored(f"Coder Prompt: {code_prompt}", Colors.BLUE)
         
-        coder_response = ollama.chat(
-            model=CODE_MODEL,
-            messages=[{'role': 'user', 'content': f'Generate only the Python code for this prompt, without any explanation: {code_prompt}'}],
-            stream=False
-        )
-        generated_code = extract_python_code(coder_response['message']['content'])
+        generated_code = quick_code(code_prompt)
+        if generated_code:
+            print_colored("[Using a built-in template instead of the coder model]", Colors.YELLOW)
+        else:
+            coder_response = ollama.chat(
+                model=CODE_MODEL,
+                messages=[{'role': 'user', 'content': f'Generate only the Python code for this prompt, without any explanation: {code_prompt}'}],
+                stream=False,
+                keep_alive=KEEP_ALIVE
+            )
+            generated_code = extract_python_code(coder_response['message']['content'])
         
         # --- NEW: EXECUTION AND CORRECTION LOOP ---
         max_retries = 2
@@ -95,8 +178,11 @@ def run_agentic_loop(user_prompt, conversation_history):
             print_colored("Error Message:\n" + execution_result['stderr'], Colors.RED)
             
             if i < max_retries - 1:
+                # Fixed instructions first and the changing code/error last, so every correction
+                # request shares the same prompt prefix.
                 correction_prompt = f"""
-                The following Python code failed:
+                The following Python code failed. Please fix the code and provide only the complete, corrected Python script.
+
                 --- CODE START ---
                 {generated_code}
                 --- CODE END ---
@@ -105,13 +191,12 @@ def run_agentic_loop(user_prompt, conversation_history):
                 --- ERROR START ---
                 {execution_result['stderr']}
                 --- ERROR END ---
-
-                Please fix the code and provide only the complete, corrected Python script.
                 """
                 coder_response = ollama.chat(
                     model=CODE_MODEL,
                     messages=[{'role': 'user', 'content': correction_prompt}],
-                    stream=False
+                    stream=False,
+                    keep_alive=KEEP_ALIVE
                 )
                 generated_code = extract_python_code(coder_response['message']['content'])
             else:
@@ -130,7 +215,7 @@ def run_agentic_loop(user_prompt, conversation_history):
         print(tool_output)
 
         if execution_result.get('image_b64'):
-            display_image_from_b64(execution_result['image_b64'])
+            display_image_from_b64(execution_result['image_b64'], execution_result.get('image_format') or "png")
 
         # --- FINAL RESPONSE STEP ---
         conversation_history.append({'role': 'assistant', 'content': assistant_response})
@@ -142,19 +227,14 @@ def run_agentic_loop(user_prompt, conversation_history):
         [ORIGINAL_QUESTION]{user_prompt}
         {tool_output}"
         """
-        conversation_history.append({'role': 'assistant', 'content': summarizer_prompt})
-        final_response = ollama.chat(model=CONVERSATION_MODEL, messages=[{'role':'system', 'content':summarizer_prompt}], stream=False)
-        final_message = final_response['message']['content']
-        conversation_history.append({'role': 'assistant', 'content': final_message})
-        
+        # The summarizer prompt is a one-off request, so it stays out of the history that is resent every turn.
         print_colored("\nJN-66:", Colors.GREEN, bold=True)
-        print(final_message)
+        final_message = stream_chat(CONVERSATION_MODEL, [{'role':'system', 'content':summarizer_prompt}])
+        conversation_history.append({'role': 'assistant', 'content': final_message})
 
     else:
-        # If no tool is needed, just respond normally
+        # If no tool is needed, the response has already been printed as it streamed
         conversation_history.append({'role': 'assistant', 'content': assistant_response})
-        print_colored("\nJN-66:", Colors.GREEN, bold=True)
-        print(assistant_response)
 
 # --- Main Application Loop (No changes here) ---
 if __name__ == "__main__":
@@ -167,6 +247,11 @@ if __name__ == "__main__":
     Do not write the code yourself. Only provide the [TOOL_USE] tag and the prompt for the coder model.
     """
     history = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+    # Prefill the system prompt once up front; every turn starts with the same bytes, so Ollama
+    # reuses the cached prefix instead of processing it again.
+    print_colored("Loading models...", Colors.YELLOW)
+    ollama.chat(model=CONVERSATION_MODEL, messages=history, keep_alive=KEEP_ALIVE, options={'num_predict': 1})
+    ollama.chat(model=CODE_MODEL, messages=[], keep_alive=KEEP_ALIVE)
     print_colored("LLM Agent Initialized. Type 'exit' to quit.", Colors.GREEN, bold=True)
     while True:
         try:
@@ -4,17 +4,52 @@ import io
 import contextlib
 import traceback
 import base64
+from functools import lru_cache
 
 # Import libraries that the LLM might use
 import numpy as np
 import pandas as pd
 import sklearn
+# A bare 'import sklearn' loads none of the estimators; pull in the commonly used ones up front.
+import sklearn.linear_model
+import sklearn.model_selection
+import sklearn.preprocessing
+import matplotlib
+# Headless rendering: select Agg before pyplot is imported so no GUI backend is probed.
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import requests
 import math # Add math for completeness
 
+# Caps the size of returned plots, and so the base64 payload
+plt.rcParams['savefig.dpi'] = 100
+# Plots are returned as lossless WebP, which is noticeably smaller than PNG for line art
+# and keeps text sharp. Clients read the format from the response's image_format field.
+IMAGE_FORMAT = 'webp'
+
+def _warm_up():
+    """
+    Exercises each library once at import so lazy initialisation (matplotlib's font cache, the
+    image encoder, pandas internals) happens here rather than on the first request. Under
+    gunicorn's preload_app this runs once in the master and the workers inherit the result.
+    """
+    np.zeros(1).sum()
+    pd.DataFrame({'a': [1]}).sum()
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1])
+    ax.set_title("warm-up")
+    fig.savefig(io.BytesIO(), format=IMAGE_FORMAT, pil_kwargs={'lossless': True})
+    plt.close('all')
+
+_warm_up()
+
 app = Flask(__name__)
 
+@lru_cache(maxsize=256)
+def _compile(code):
+    """Compiles submitted code, reusing the code object when the same script is sent again (e.g. on retries)."""
+    return compile(code, '<sandbox>', 'exec')
+
 @app.route("/execute", methods=["POST"])
 def execute_code():
     data = request.get_json()
@@ -27,29 +62,32 @@ def execute_code():
     stderr_buffer = io.StringIO()
     image_buffer = io.BytesIO()
     
-    try:
-        with contextlib.redirect_stdout(stdout_buffer):
-            with contextlib.redirect_stderr(stderr_buffer):
-                # The 'globals()' dict provides the scope for exec
-                exec_scope = globals()
-                exec(code, exec_scope)
+    # Style or rcParams changes made by a script are undone afterwards, so they don't reach later requests.
+    with plt.rc_context():
+        try:
+            with contextlib.redirect_stdout(stdout_buffer):
+                with contextlib.redirect_stderr(stderr_buffer):
+                    # A fresh copy of the module globals per request: the pre-imported libraries are
+                    # available, but variables defined by one request don't leak into the next.
+                    exec_scope = dict(globals())
+                    exec(_compile(code), exec_scope)
 
-        # --- THIS IS THE CORRECTED LOGIC ---
-        # Heuristic: Check if the code likely generated a plot by seeing if 'plt' or 'matplotlib' was used.
-        # This is more reliable than checking for lingering figure numbers.
-        if 'plt' in code or 'matplotlib' in code:
-            # Check if there are any active figures to save
-            if plt.get_fignums():
-                # Save the current figure to the image buffer
-                plt.savefig(image_buffer, format='png', bbox_inches='tight')
+            # --- THIS IS THE CORRECTED LOGIC ---
+            # Heuristic: Check if the code likely generated a plot by seeing if 'plt' or 'matplotlib' was used.
+            # This is more reliable than checking for lingering figure numbers.
+            if 'plt' in code or 'matplotlib' in code:
+                # Check if there are any active figures to save
+                if plt.get_fignums():
+                    # Save the current figure to the image buffer
+                    plt.savefig(image_buffer, format=IMAGE_FORMAT, bbox_inches='tight', pil_kwargs={'lossless': True})
             
-            # CRITICAL FIX: Close all figures to prevent them from carrying over to the next request.
-            plt.close('all')
+                # CRITICAL FIX: Close all figures to prevent them from carrying over to the next request.
+                plt.close('all')
 
-    except Exception:
-        stderr_buffer.write(traceback.format_exc())
-        # Also ensure plots are closed even if an error occurs
-        plt.close('all')
+        except Exception:
+            stderr_buffer.write(traceback.format_exc())
+            # Also ensure plots are closed even if an error occurs
+            plt.close('all')
 
 
     # --- Prepare the JSON response ---
@@ -65,9 +103,11 @@ def execute_code():
     return jsonify({
         "stdout": stdout_val,
         "stderr": stderr_val,
-        "image_b64": image_b64
+        "image_b64": image_b64,
+        "image_format": IMAGE_FORMAT if image_b64 else None
     })
 
+# The container serves the app with gunicorn (see gunicorn_conf.py); this is for local testing only.
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000)
     
\ No newline at end of file
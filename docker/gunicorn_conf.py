@@ -0,0 +1,29 @@
+# gunicorn_conf.py
+# Serves app.py in the sandbox container (see the Dockerfile's CMD).
+import os
+
+bind = "0.0.0.0:5000"
+
+# Each worker is a separate process with its own exec scope and matplotlib state, so
+# requests can run side by side without sharing variables or figures. Set SANDBOX_WORKERS
+# to lower the count on memory-constrained hosts such as a Raspberry Pi.
+workers = int(os.environ.get("SANDBOX_WORKERS", os.cpu_count() or 1))
+
+# Sync workers handle one request at a time, which the exec scope and pyplot need. They
+# also only heartbeat between requests, so the timeout below applies to the execution itself.
+# (A gthread worker keeps heartbeating while its request thread spins, and is never timed out.)
+worker_class = "sync"
+
+# Import numpy, pandas, sklearn and matplotlib once in the master; workers share those pages.
+# Workers replaced after a timeout or max_requests are forked from it, so they start warm.
+# The master never runs submitted code, so replacements start from a clean state.
+preload_app = True
+
+# A worker stuck in runaway code (e.g. `while True: pass`) is killed and replaced after
+# this many seconds, matching the clients' 30 second request timeout.
+timeout = 30
+
+# Replace each worker after a number of executions so memory leaked by generated code
+# (module-level caches, C extensions) can't build up. Jitter keeps workers from restarting together.
+max_requests = 50
+max_requests_jitter = 10
@@ -3,8 +3,11 @@
 import discord
 from discord.ext import commands
 import os
+import asyncio
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from dotenv import load_dotenv
 import json
 from utils.scheduler import Scheduler
@@ -47,9 +50,16 @@ handler = RotatingFileHandler(
     backupCount=3  # Number of backup files to keep
 )
 
+# Log calls only enqueue the record; a background thread does the file writes and rotation,
+# so logging never blocks the event loop on disk I/O.
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop) # Flushes anything still queued on shutdown
+
 root_logger = logging.getLogger()
 root_logger.handlers.clear()
-root_logger.addHandler(handler)
+root_logger.addHandler(QueueHandler(log_queue))
 
 log.info(f"Logging initialized. Log files will be saved to: {log_location}")
 
@@ -72,6 +82,10 @@ class JN66Bot(commands.Bot):
         self.model = config.get('ollama_model','gemma2:2b') # Still needed for some cogs, should be fixed
         self.conversation_model = config.get('conversation_model', 'gemma2:2b')
         self.coder_model = config.get('coder_model', 'qwen2.5-coder:1.5b')
+        # Model used by !t to extract tasks. Defaults to ollama_model so it can stay at higher precision than the chat model.
+        self.task_model = config.get('task_model', self.model)
+        # How long Ollama keeps models loaded between requests (-1 = until Ollama restarts, or a duration such as "30m")
+        self.ollama_keep_alive = config.get('ollama_keep_alive', -1)
         self.sandbox_url = config.get('sandbox_url', 'http://localhost:5000/execute')
         self.local_timezone = config.get('local_timezone', 'America/New_York')
         self.calendars = config.get('calendars_to_check', [])
@@ -81,13 +95,17 @@ class JN66Bot(commands.Bot):
     async def setup_hook(self):
         """A hook that runs after login but before connecting to the websocket."""
         log.info("--- Loading Cogs ---")
-        for filename in os.listdir('./cogs'):
-            if filename.endswith('.py'):
-                try:
-                    await self.load_extension(f'cogs.{filename[:-3]}')
-                    log.info(f"Loaded cog: {filename}")
-                except Exception as e:
-                    log.error(f"Failed to load cog {filename}", exc_info=True)
+        filenames = [filename for filename in os.listdir('./cogs') if filename.endswith('.py')]
+        # Cogs are independent, so they load together; one cog's awaits in cog_load don't hold up the rest.
+        results = await asyncio.gather(
+            *(self.load_extension(f'cogs.{filename[:-3]}') for filename in filenames),
+            return_exceptions=True
+        )
+        for filename, result in zip(filenames, results):
+            if isinstance(result, BaseException):
+                log.error(f"Failed to load cog {filename}", exc_info=result)
+            else:
+                log.info(f"Loaded cog: {filename}")
         
 
     async def on_ready(self):
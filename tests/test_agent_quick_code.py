@@ -0,0 +1,26 @@
+# tests/test_agent_quick_code.py
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'docker'))
+try:
+    import agent
+except ImportError:  # agent.py needs the standalone agent's requirements (ollama, requests, Pillow)
+    agent = None
+
+
+@unittest.skipIf(agent is None, "docker/agent.py dependencies are not installed")
+class QuickCodeTests(unittest.TestCase):
+    def test_simple_prompts_use_a_template(self):
+        self.assertEqual(agent.quick_code("calculate the square root of 2"), "import math\nprint(math.sqrt(2))")
+        self.assertEqual(agent.quick_code("What is the factorial of 5?"), "import math\nprint(math.factorial(5))")
+        self.assertEqual(agent.quick_code("2 to the power of 10"), "print(2 ** 10)")
+
+    def test_compound_prompts_go_to_the_coder(self):
+        self.assertIsNone(agent.quick_code("plot sin(x) and also give the square root of 2"))
+        self.assertIsNone(agent.quick_code("square root of 2 and plot it"))
+
+
+if __name__ == '__main__':
+    unittest.main()
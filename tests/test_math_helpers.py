@@ -0,0 +1,48 @@
+# tests/test_math_helpers.py
+import unittest
+
+from utils.math_helpers import try_direct_math
+
+
+class TryDirectMathTests(unittest.TestCase):
+    def test_arithmetic_is_answered(self):
+        self.assertEqual(try_direct_math("2 + 3 * 4"), 14)
+        self.assertEqual(try_direct_math("sqrt(256)"), 16.0)
+        self.assertEqual(try_direct_math("2**10"), 1024)
+        self.assertAlmostEqual(try_direct_math("7.5 / 2.5"), 3.0)
+
+    def test_dates_are_left_for_the_model(self):
+        self.assertIsNone(try_direct_math("2025-12-25"))
+        self.assertIsNone(try_direct_math("2024-10-15 "))
+        self.assertIsNone(try_direct_math("10/15"))
+        self.assertIsNone(try_direct_math("10/15/2024"))
+
+    def test_phone_numbers_are_left_for_the_model(self):
+        self.assertIsNone(try_direct_math("555-1234"))
+
+    def test_non_finite_results_are_rejected(self):
+        self.assertIsNone(try_direct_math("1e308*10"))
+        self.assertIsNone(try_direct_math("-1e308*10"))
+
+    def test_large_int_results_are_answered_without_overflow(self):
+        self.assertEqual(try_direct_math("9**400"), 9**400)
+        self.assertEqual(try_direct_math("10**1000"), 10**1000)
+
+    def test_float_overflow_is_rejected(self):
+        self.assertIsNone(try_direct_math("exp(1000)"))
+        self.assertIsNone(try_direct_math("sqrt(10**1000)"))
+
+    def test_round_digits_are_bounded(self):
+        self.assertEqual(try_direct_math("round(1234.5678, 2)"), 1234.57)
+        self.assertIsNone(try_direct_math("round(5, -10**7)"))
+        self.assertIsNone(try_direct_math("round(5, -10**8)"))
+
+    def test_bare_numbers_and_text_are_rejected(self):
+        self.assertIsNone(try_direct_math("42"))
+        self.assertIsNone(try_direct_math("-42"))
+        self.assertIsNone(try_direct_math("what is the weather"))
+        self.assertIsNone(try_direct_math("9**9**9"))
+
+
+if __name__ == '__main__':
+    unittest.main()
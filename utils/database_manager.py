@@ -1,6 +1,8 @@
 import sqlite3
 import logging
+import threading
 from datetime import datetime
+from itertools import groupby
 
 log = logging.getLogger(__name__)
 
@@ -13,11 +15,40 @@ tasks contains task items created by the user
 
 class DatabaseManager:
     def __init__(self, db_name):
-        self.conn = sqlite3.connect(db_name) # User should add the .db extension
+        self.db_name = db_name # User should add the .db extension
+        # Each thread (the event loop and the to_thread workers) gets its own connection, opened on
+        # first use. With WAL, readers then never wait on each other or on the writer.
+        self._local = threading.local()
         log.info(f"Using {db_name} for the database.")
-        self.cursor = self.conn.cursor()
         self.create_tables()
 
+    @property
+    def conn(self):
+        """The calling thread's connection, opened and configured on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name)
+            # Rows support row['column'] and keys() without building a dict per row.
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            self.configure_connection()
+        return conn
+
+    @property
+    def cursor(self):
+        """The cursor belonging to the calling thread's connection."""
+        self.conn  # opens this thread's connection if needed
+        return self._local.cursor
+
+    def configure_connection(self):
+        """Tunes SQLite for many small writes: WAL turns commits into appends instead of full fsyncs."""
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+        self.cursor.execute("PRAGMA mmap_size=268435456") # 256 MB
+        self.cursor.execute("PRAGMA busy_timeout=5000") # ms to wait on a lock before failing
+
     def create_tables(self):
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS tasks (
@@ -35,6 +66,12 @@ class DatabaseManager:
         ''')
         self.conn.commit()
 
+        # Serves the "pending and due" lookup behind !tasks and the daily task job
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks(status, due_date)
+        ''')
+        self.conn.commit()
+
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS messages (
             message_id INTEGER PRIMARY KEY,
@@ -61,6 +98,18 @@ class DatabaseManager:
         self.cursor.execute(sql, tuple(record.values()))
         self.conn.commit()
         return self.cursor.lastrowid
+
+    def store_bulk(self, rows):
+        """
+        Inserts many records with a single commit.
+        rows is a list of (table, record) tuples. Consecutive records for the same table
+        with the same columns are inserted with one executemany.
+        """
+        for (table, columns), group in groupby(rows, key=lambda row: (row[0], tuple(row[1].keys()))):
+            placeholders = ', '.join(['?'] * len(columns))
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+            self.cursor.executemany(sql, [tuple(record.values()) for _, record in group])
+        self.conn.commit()
     
     def store_message(self, message):
         return self.store("messages", message)
@@ -78,6 +127,7 @@ class DatabaseManager:
         
         Criteria values can be a simple value for an exact match ('='),
         or a tuple containing an operator and a value, e.g., ('<=', '2025-08-04').
+        Returns a list of sqlite3.Row objects; use dict(row) where a mutable dict is needed.
         """
         query = f"SELECT * FROM {table}"
         if criteria:
@@ -99,21 +149,31 @@ class DatabaseManager:
             if where_clauses:
                 where_clause_str = " AND ".join(where_clauses)
                 query += f" WHERE {where_clause_str}"
-                self.cursor.execute(query, parameters)
-            else:
-                self.cursor.execute(query) # Fallback if criteria was empty or invalid
         else:
-            self.cursor.execute(query)
-            
-        rows = self.cursor.fetchall()
-        field_names = [description[0] for description in self.cursor.description]
-        results = [dict(zip(field_names, row)) for row in rows]
-        return results
+            parameters = []
+
+        # parameters is empty if criteria was empty or invalid
+        self.cursor.execute(query, parameters)
+        return self.cursor.fetchall()
 
     def fetch_tasks(self, criteria = None):
         return self.fetch("tasks", criteria)
         
     
+    def fetch_due_tasks(self, today_iso):
+        """
+        Fetches pending tasks due on or before today_iso, flagged with is_overdue and
+        ordered by due date, then priority (HIGH, MEDIUM, LOW, anything else).
+        """
+        sql = '''
+        SELECT *, due_date < ? AS is_overdue FROM tasks
+        WHERE status = 'pending' AND due_date <= ?
+        ORDER BY due_date ASC,
+            CASE priority WHEN 'HIGH' THEN 1 WHEN 'MEDIUM' THEN 2 WHEN 'LOW' THEN 3 ELSE 4 END
+        '''
+        self.cursor.execute(sql, (today_iso, today_iso))
+        return self.cursor.fetchall()
+
     def fetch_messages(self, criteria = None):
         return self.fetch("messages", criteria)
         
@@ -138,7 +198,7 @@ class DatabaseManager:
     def delete_task(self, task_id):
         sql = "DELETE FROM tasks WHERE task_id = ?"
         self.cursor.execute(sql, (task_id,))
-        self.conn.commit()    
+        self.conn.commit()
 
     def count_tasks(self, criteria):
         """Counts tasks based on a given criteria dictionary"""
@@ -17,7 +17,7 @@ async def send_long_message(channel: discord.abc.Messageable, text: str):
         await channel.send(text)
     else:
         log.info("Response is too long, splitting into chunks...")
-        # Split the text into chunks of 2000 characters
-        chunks = [text[i:i + 2000] for i in range(0, len(text), 2000)]
-        for chunk in chunks:
-            await channel.send(chunk)
\ No newline at end of file
+        # Send 2000-character chunks one at a time: concurrent sends could arrive out of order,
+        # and each slice is only made when it is about to be sent.
+        for i in range(0, len(text), 2000):
+            await channel.send(text[i:i + 2000])
\ No newline at end of file
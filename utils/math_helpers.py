@@ -0,0 +1,84 @@
+# utils/math_helpers.py
+import ast
+import math
+import operator
+import re
+
+# Operators and names allowed in a message that is answered directly as arithmetic
+_MATH_BINOPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+_MATH_UNARYOPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_MATH_FUNCS = {
+    'sqrt': math.sqrt, 'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+    'log': math.log, 'log10': math.log10, 'exp': math.exp, 'abs': abs, 'round': round,
+}
+_MATH_CONSTANTS = {'pi': math.pi, 'e': math.e}
+# Keeps expressions like 9**9**9 from tying up the event loop
+MAX_MATH_EXPONENT = 1000
+MAX_MATH_INT_BITS = 4096
+# round(5, -10**8) builds a huge power of ten internally, so ndigits is kept small.
+MAX_ROUND_DIGITS = 100
+
+# Dates such as 2025-12-25 or 10/15/2024 parse as arithmetic but aren't questions about it.
+_DATE_LIKE_RE = re.compile(r'\d+\s*[-/]\s*\d+\s*[-/]\s*\d+')
+
+def _eval_math_node(node):
+    """Evaluates a whitelisted arithmetic AST node, raising ValueError for anything else."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in _MATH_CONSTANTS:
+        return _MATH_CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _MATH_UNARYOPS:
+        return _MATH_UNARYOPS[type(node.op)](_eval_math_node(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in _MATH_BINOPS:
+        left, right = _eval_math_node(node.left), _eval_math_node(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_MATH_EXPONENT:
+            raise ValueError("Exponent too large")
+        result = _MATH_BINOPS[type(node.op)](left, right)
+        if isinstance(result, int) and result.bit_length() > MAX_MATH_INT_BITS:
+            raise ValueError("Result too large")
+        return result
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _MATH_FUNCS
+            and not node.keywords):
+        args = [_eval_math_node(arg) for arg in node.args]
+        if node.func.id == 'round' and len(args) > 1 and abs(args[1]) > MAX_ROUND_DIGITS:
+            raise ValueError("Too many digits to round to")
+        return _MATH_FUNCS[node.func.id](*args)
+    raise ValueError("Unsupported expression")
+
+def _is_separated_integers(node) -> bool:
+    """True for integers joined only by '-' or '/', e.g. a phone number (555-1234) or a date (10/15)."""
+    if isinstance(node, ast.Constant):
+        return type(node.value) is int
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return _is_separated_integers(node.operand)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Sub, ast.Div)):
+        return _is_separated_integers(node.left) and _is_separated_integers(node.right)
+    return False
+
+def try_direct_math(text: str):
+    """
+    Returns the value of `text` if it is unambiguously an arithmetic expression such as "sqrt(256)"
+    or "2**10 / 3", otherwise None. Bare numbers, dates, phone numbers and non-finite results are
+    left for the model.
+    """
+    text = text.strip()
+    if _DATE_LIKE_RE.search(text):
+        return None
+    try:
+        tree = ast.parse(text, mode='eval')
+        body = tree.body.operand if isinstance(tree.body, ast.UnaryOp) else tree.body
+        if isinstance(body, (ast.Constant, ast.Name)) or _is_separated_integers(tree.body):
+            return None
+        result = _eval_math_node(tree.body)
+    except (SyntaxError, ValueError, TypeError, ArithmeticError, RecursionError):
+        return None
+    # complex results (e.g. (-8) ** 0.5) aren't what anyone asking for arithmetic expects.
+    # Ints are checked by size rather than converted to float, which overflows for 10**1000.
+    if isinstance(result, int):
+        return result if result.bit_length() <= MAX_MATH_INT_BITS else None
+    if not isinstance(result, float) or not math.isfinite(result):
+        return None
+    return result
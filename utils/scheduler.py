@@ -18,6 +18,14 @@ def time_until(target_time: time) -> float:
     else:
         return (target_today - now).total_seconds()
 
+# tasks.loop() keywords that set the interval between runs
+_INTERVAL_KEYS = ('seconds', 'minutes', 'hours')
+
+def _is_daily(frequency_kwargs: dict) -> bool:
+    """True if the loop keywords describe one run per day (or give no interval at all)."""
+    interval = {key: value for key, value in frequency_kwargs.items() if key in _INTERVAL_KEYS}
+    return not interval or timedelta(**interval) == timedelta(days=1)
+
 class Job:
     """Represents a single job to be scheduled."""
     # --- MODIFICATION: Make target_time optional ---
@@ -45,8 +53,11 @@ class Scheduler:
         self.bot = bot
         self.timezone = None # Will get from a configuration eventually
 
-    def add_job(self, job: Job):
-        """Creates and schedules a task based on a Job object."""
+    def add_job(self, job: Job) -> Job:
+        """
+        Creates and schedules a task based on a Job object.
+        Returns the job so the caller can later pass it to remove_job().
+        """
         async def job_wrapper():
             # ... (this wrapper remains the same) ...
             target = None
@@ -74,13 +85,32 @@ class Scheduler:
                 log.info(f"Job '{job.callback.__name__}' starting its first cycle immediately.")
                 return
 
-        task_loop = tasks.loop(**job.frequency_kwargs)(job_wrapper)
-        task_loop.before_loop(before_wrapper)
+        if job.target_time and _is_daily(job.frequency_kwargs):
+            # discord.py schedules time-of-day loops against the wall clock on every run, so the
+            # job doesn't drift after sleeps, reconnects or clock changes.
+            other_kwargs = {key: value for key, value in job.frequency_kwargs.items() if key not in _INTERVAL_KEYS}
+            task_loop = tasks.loop(time=job.target_time, **other_kwargs)(job_wrapper)
+        else:
+            task_loop = tasks.loop(**job.frequency_kwargs)(job_wrapper)
+            task_loop.before_loop(before_wrapper)
         
         job.task = task_loop
         self._jobs.append(job)
         log.info(f"Successfully scheduled job '{job.callback.__name__}' to target '{job.target_type}' with ID {job.target_id}.")
 
+        # Jobs added after on_ready (e.g. by a reloaded cog) would otherwise never start.
+        if self.bot.is_ready():
+            task_loop.start()
+        return job
+
+    def remove_job(self, job: Job):
+        """Cancels a scheduled job and stops tracking it."""
+        if job.task:
+            job.task.cancel()
+        if job in self._jobs:
+            self._jobs.remove(job)
+            log.info(f"Removed scheduled job '{job.callback.__name__}'.")
+
 
     def start_all(self):
         # ... (no changes here)
@@ -1,83 +1,178 @@
 # utils/task_agent.py
 
-from ollama import chat
+import asyncio
+from ollama import AsyncClient
 # --- We'll bring back the more robust validation from before ---
-from pydantic import BaseModel, Field, ValidationError, field_validator
-from datetime import datetime
-import parsedatetime as pdt
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from datetime import date, datetime, timedelta
+from functools import cached_property, lru_cache
+from typing import Literal
 import logging
+import re
 
 log = logging.getLogger(__name__)
-cal = pdt.Calendar()
+
+# Common due phrases resolved without parsedatetime, as day offsets from today.
+_DUE_OFFSETS = {'': 0, 'today': 0, 'tonight': 0, 'now': 0, 'tomorrow': 1, 'yesterday': -1}
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_cal = None
+
+@lru_cache(maxsize=256)
+def _parse_due(phrase: str, today: date) -> str:
+    """Falls back to parsedatetime. `today` is part of the cache key so relative phrases don't go stale."""
+    global _cal
+    if _cal is None:
+        # parsedatetime is slow to import and only needed for the uncommon phrases.
+        import parsedatetime as pdt
+        _cal = pdt.Calendar()
+    time_struct, parse_status = _cal.parse(phrase)
+    if parse_status != 0:
+        return datetime(*time_struct[:6]).date().isoformat()
+    return today.isoformat()
+
+# Kept short: the prompt is prefilled on every task, and the Task validator below catches bad output.
+_TASK_RULES = (
+    'description: concise summary of the user\'s task, never invented or empty. '
+    'priority: from the urgency of the wording, MEDIUM if unclear. '
+    'due: the date phrase from the prompt, "today" if none.'
+)
+SYSTEM_PROMPT = 'Extract the task as JSON {"description":str,"priority":"LOW"|"MEDIUM"|"HIGH","due":str}. ' + _TASK_RULES
+BULK_SYSTEM_PROMPT = (
+    'The user lists numbered tasks. Return JSON {"tasks":[...]} with one task per item, in order. '
+    'Each task is {"description":str,"priority":"LOW"|"MEDIUM"|"HIGH","due":str}. ' + _TASK_RULES
+)
+
+# A task is well under 100 tokens of JSON, so cap decoding in case the model rambles.
+# num_ctx is left alone: a different context size makes Ollama reload a model shared with the chat cog.
+TASK_OPTIONS = {'temperature': 0.1, 'top_k': 20, 'num_predict': 128}
 
 class Task(BaseModel):
-    description: str = Field(..., description="A concise summary of the task to be done.")
-    priority: str = Field(..., description="The priority of the task, must be one of: LOW, MEDIUM, HIGH.")
+    # Stripping happens in pydantic-core, before the checks below. Extra keys are
+    # rejected (and excluded from the schema), and frozen makes caching due_date safe.
+    model_config = ConfigDict(str_strip_whitespace=True, frozen=True, extra='forbid')
+
+    description: str = Field(..., min_length=1, description="A concise summary of the task to be done.")
+    priority: Literal['LOW', 'MEDIUM', 'HIGH'] = Field(..., description="The priority of the task.")
     due: str = Field(..., description="The natural language phrase indicating the due date (e.g., 'tomorrow', 'next Friday', 'August 15th').")
 
     @field_validator('description')
     def validate_description(cls, value):
-        if not value or not value.strip():
+        if not value or value.isspace():
             raise ValueError("Task description cannot be empty.")
         return value
 
-    @property
+    @cached_property
     def due_date(self) -> str:
-        time_struct, parse_status = cal.parse(self.due)
-        if parse_status != 0:
-            return datetime(*time_struct[:6]).date().isoformat()
-        else:
-            return datetime.now().date().isoformat()
+        phrase = self.due.strip().lower()
+        today = date.today()
+        if phrase in _DUE_OFFSETS:
+            return (today + timedelta(days=_DUE_OFFSETS[phrase])).isoformat()
+        if _ISO_DATE_RE.fullmatch(phrase):
+            try:
+                return date.fromisoformat(phrase).isoformat()
+            except ValueError:
+                pass
+        return _parse_due(phrase, today)
+
+# Passed to Ollama as the response format so decoding is constrained to a valid Task.
+TASK_SCHEMA = Task.model_json_schema()
+# Used directly on the hot path instead of going through Task.model_validate_json.
+_TASK_VALIDATOR = Task.__pydantic_validator__
+
+class TaskList(BaseModel):
+    tasks: list[Task]
+
+TASK_LIST_SCHEMA = TaskList.model_json_schema()
+_TASK_LIST_VALIDATOR = TaskList.__pydantic_validator__
+
+# Responses longer than this (usually bulk lists) are validated in a worker thread.
+THREADED_VALIDATION_CHARS = 2048
+
+async def _validate_json(validator, content: str):
+    if len(content) > THREADED_VALIDATION_CHARS:
+        return await asyncio.to_thread(validator.validate_json, content)
+    return validator.validate_json(content)
+
+def _task_dict(task_model: Task) -> dict:
+    return {
+        'description': task_model.description,
+        'priority': task_model.priority,
+        'due_date': task_model.due_date
+    }
 
 class Agent:
-    def __init__(self, model_name='gemma2:2b'):
+    def __init__(self, model_name='gemma2:2b', keep_alive=-1):
         self.model_name = model_name
+        self.keep_alive = keep_alive
+        # Async client so task parsing runs on the event loop instead of a worker thread.
+        self.client = AsyncClient()
+
+    async def warmup(self):
+        """Loads the model and prefills the system prompt so the first task doesn't pay for a cold start."""
+        await self.client.chat(
+            model=self.model_name, messages=[{'role': 'system', 'content': SYSTEM_PROMPT}],
+            keep_alive=self.keep_alive, options={'num_predict': 1}
+        )
 
-    def process_task(self, prompt: str) -> dict:
+    async def process_tasks(self, prompts: list[str]) -> list:
         """
-        Uses an LLM to process a natural language prompt into a structured task.
-        Includes a retry loop to handle validation errors.
+        Processes several prompts concurrently. Failed prompts come back as the
+        exception instead of a task dict, so one bad prompt doesn't sink the batch.
+        """
+        return await asyncio.gather(*(self.process_task(prompt) for prompt in prompts), return_exceptions=True)
+
+    async def process_tasks_bulk(self, prompts: list[str]) -> list:
         """
-        # --- NEW, IMPROVED PROMPT ---
-        # This prompt is more direct and avoids overly specific examples that the LLM might latch onto.
-        system_prompt = """
-        You are a task management assistant. Your job is to analyze a user's request and extract key details into a JSON object.
-        From the user's prompt, you must extract three pieces of information:
-
-        1.  `description`: This MUST be a concise summary of the task from the user's prompt. Do NOT make up a task. For example, if the user says "remind me to finish the quarterly report", the description should be "Finish the quarterly report". This field cannot be empty.
-        2.  `priority`: Analyze the user's language for urgency. Choose ONLY ONE of: LOW, MEDIUM, or HIGH. Default to MEDIUM if unsure.
-        3.  `due`: Extract the part of the prompt that indicates the due date. If no date is mentioned, use the word "today".
+        Processes several prompts with a single model call. Falls back to
+        process_tasks() if the batched answer doesn't validate or doesn't have
+        one task per prompt, so the result has the same shape either way.
         """
-        
+        numbered = "\n".join(f"{i}. {prompt}" for i, prompt in enumerate(prompts, 1))
         messages = [
-            {'role': 'system', 'content': system_prompt},
+            {'role': 'system', 'content': BULK_SYSTEM_PROMPT},
+            {'role': 'user', 'content': numbered}
+        ]
+
+        response = await self.client.chat(
+            messages=messages,
+            model=self.model_name,
+            format=TASK_LIST_SCHEMA,
+            options={**TASK_OPTIONS, 'num_predict': TASK_OPTIONS['num_predict'] * len(prompts)},
+            keep_alive=self.keep_alive
+        )
+
+        try:
+            task_list = await _validate_json(_TASK_LIST_VALIDATOR, response['message']['content'])
+            if len(task_list.tasks) == len(prompts):
+                return [_task_dict(task_model) for task_model in task_list.tasks]
+            log.warning(f"Bulk task parse returned {len(task_list.tasks)} tasks for {len(prompts)} prompts. Falling back to one call per task.")
+        except ValidationError as e:
+            log.warning(f"Bulk task validation failed, falling back to one call per task. Error: {e}")
+        return await self.process_tasks(prompts)
+
+    async def process_task(self, prompt: str) -> dict:
+        """
+        Uses an LLM to process a natural language prompt into a structured task.
+        The output is schema-constrained, so a single attempt is enough; the
+        validator is kept as a final check.
+        """
+        messages = [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
             {'role': 'user', 'content': prompt}
         ]
 
-        max_retries = 2
-        for i in range(max_retries):
-            response = chat(
-                messages=messages,
-                model=self.model_name,
-                format='json',
-                options={'temperature': 0.1} # Lowered temperature for more determinism
-            )
-            response_content = response['message']['content']
-            
-            try:
-                task_model = Task.model_validate_json(response_content)
-                return {
-                    'description': task_model.description,
-                    'priority': task_model.priority,
-                    'due_date': task_model.due_date
-                }
-            except ValidationError as e:
-                log.warning(f"Task validation failed on attempt {i + 1}. Error: {e}")
-                if i < max_retries - 1:
-                    correction_prompt = f"Your previous JSON was invalid. Please correct it based on the user's original prompt.\n\nERRORS:\n{e}\n\nPlease provide only the corrected JSON object."
-                    messages.append({'role': 'assistant', 'content': response_content})
-                    messages.append({'role': 'user', 'content': correction_prompt})
-                else:
-                    raise e
-        
-        raise ValueError("Failed to get a valid task from the LLM after multiple attempts.")
\ No newline at end of file
+        response = await self.client.chat(
+            messages=messages,
+            model=self.model_name,
+            format=TASK_SCHEMA,
+            options=TASK_OPTIONS,
+            keep_alive=self.keep_alive # Keep the model loaded between tasks
+        )
+        response_content = response['message']['content']
+
+        try:
+            task_model = await _validate_json(_TASK_VALIDATOR, response_content)
+        except ValidationError as e:
+            log.warning(f"Task validation failed. Error: {e}")
+            raise
+        return _task_dict(task_model)
\ No newline at end of file
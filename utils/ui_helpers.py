@@ -1,15 +1,20 @@
 # utils/ui_helpers.py
+import asyncio
 import discord
 import logging
 from datetime import date
-from typing import List, Dict, TYPE_CHECKING
+from typing import List, TYPE_CHECKING
 
 # This is a common pattern to allow type hinting for a class that would cause a circular import.
 if TYPE_CHECKING:
+    import sqlite3
     from .database_manager import DatabaseManager
 
 log = logging.getLogger(__name__)
 
+# Discord allows at most 25 components on a message.
+MAX_TASK_BUTTONS = 25
+
 # Define standard colors for consistency across the bot's embeds
 class EmbedColors:
     SUCCESS = 0x4CAF50  # Green
@@ -86,55 +91,96 @@ class ConfirmationView(discord.ui.View):
         self.value = False
         self.stop()
 
-class TaskButton(discord.ui.Button):
-    """A button that represents a single task. When clicked, it marks the task as complete."""
-    
-    def __init__(self, task: Dict, db_manager: 'DatabaseManager'):
+class TaskButton(discord.ui.DynamicItem[discord.ui.Button], template=r'task_(?P<task_id>\d+)'):
+    """
+    A button that represents a single task. When clicked, it marks the task as complete.
+    Clicks are matched on the custom_id, so buttons on old task lists keep working after a restart
+    once the class is registered with `bot.add_dynamic_items`.
+    """
+
+    def __init__(self, task_id: int, label: str, db_manager: 'DatabaseManager'):
         """
         Args:
-            task: The task dictionary from the database.
+            task_id: The ID of the task this button completes.
+            label: The button text.
             db_manager: An instance of the DatabaseManager to perform the update.
         """
-        label_text = task['description'].upper() if task.get('is_overdue', False) else task['description']
-        label_text = f"({task['task_id']}) " + label_text
-        # Discord button labels have an 80-character limit.
-        super().__init__(label=label_text[:80], style=discord.ButtonStyle.primary, custom_id=f"task_{task['task_id']}")
-        self.task_id = task['task_id']
-        self.task_description = task['description']
+        super().__init__(discord.ui.Button(label=label, style=discord.ButtonStyle.primary, custom_id=f"task_{task_id}"))
+        self.task_id = task_id
         self.db_manager = db_manager
 
+    @classmethod
+    def from_task(cls, task: 'sqlite3.Row', db_manager: 'DatabaseManager') -> 'TaskButton':
+        """Builds the button for a task row from the database."""
+        task_id = task['task_id']
+        description = task['description']
+        is_overdue = 'is_overdue' in task.keys() and task['is_overdue']
+        label_text = f"({task_id}) {description.upper() if is_overdue else description}"
+        # Discord button labels have an 80-character limit.
+        return cls(task_id, label_text[:80], db_manager)
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        """Rebuilds the button from a click, which may be on a message sent before the last restart."""
+        # The cog may be unloaded or mid-reload; the callback then tells the user instead of failing.
+        cog = interaction.client.get_cog('LLMCog')
+        return cls(int(match['task_id']), item.label, cog.db if cog else None)
+
+    def _updated_view(self, message: discord.Message) -> discord.ui.View:
+        """Rebuilds the message's buttons with this one disabled and checked off."""
+        view = discord.ui.View(timeout=None)
+        for child in discord.ui.View.from_message(message, timeout=None).children:
+            if child.custom_id == self.custom_id:
+                child.disabled = True
+                child.style = discord.ButtonStyle.success
+                child.label = "✓ " + child.label # Add a checkmark
+            elif not child.disabled:
+                # Keep the remaining buttons dispatching through this class rather than the stored view.
+                match = self.__discord_ui_compiled_template__.fullmatch(child.custom_id or '')
+                if match:
+                    button = TaskButton(int(match['task_id']), child.label, self.db_manager)
+                    button.row = child.row
+                    child = button
+            view.add_item(child)
+        return view
+
     async def callback(self, interaction: discord.Interaction):
         """This function is called when a user clicks the button."""
+        if self.db_manager is None:
+            await interaction.response.send_message("Tasks can't be updated right now. Please try again in a moment.", ephemeral=True)
+            return
         try:
-            # 1. Update the database record.
+            # 1. Update the database record off the event loop.
             today_iso = date.today().isoformat()
             updates = {'status': 'completed', 'date_completed': today_iso}
-            self.db_manager.update_task(self.task_id, updates)
-
-            # 2. Provide visual feedback by disabling the button and changing its look.
-            self.disabled = True
-            self.style = discord.ButtonStyle.success
-            self.label = "✓ " + self.label # Add a checkmark
-            
-            # 3. Edit the original message to show the updated view (with the disabled button).
-            await interaction.response.edit_message(view=self.view)
-            
-            # 4. Send a quiet, ephemeral confirmation to the user who clicked.
-            await interaction.followup.send(f'Task "{self.task_description}" marked as completed!', ephemeral=True)
+            await asyncio.to_thread(self.db_manager.update_task, self.task_id, updates)
+
+            # 2. Edit the original message to show the clicked button as disabled.
+            await interaction.response.edit_message(view=self._updated_view(interaction.message))
+
+            # 3. Send a quiet, ephemeral confirmation to the user who clicked.
+            await interaction.followup.send(f'Task "{self.item.label}" marked as completed!', ephemeral=True)
             log.info(f"Task ID {self.task_id} marked as complete by {interaction.user.name}.")
 
         except Exception as e:
             log.error(f"Error in TaskButton callback for task {self.task_id}: {e}", exc_info=True)
-            await interaction.followup.send("Sorry, there was an error completing that task.", ephemeral=True)
+            # A followup only works once the interaction has been responded to.
+            if interaction.response.is_done():
+                await interaction.followup.send("Sorry, there was an error completing that task.", ephemeral=True)
+            else:
+                await interaction.response.send_message("Sorry, there was an error completing that task.", ephemeral=True)
 
 
 class TaskView(discord.ui.View):
     """A view that displays a list of tasks as clickable buttons."""
     
-    def __init__(self, tasks: List[Dict], db_manager: 'DatabaseManager'):
+    def __init__(self, tasks: List['sqlite3.Row'], db_manager: 'DatabaseManager'):
         super().__init__(timeout=None) # Set a long or no timeout
         
         # For each pending task, create and add a button to the view.
-        for task in tasks:
-            if task['status'] == 'pending':
-                self.add_item(TaskButton(task, db_manager))
\ No newline at end of file
+        pending = [task for task in tasks if task['status'] == 'pending']
+        if len(pending) > MAX_TASK_BUTTONS:
+            log.info(f"Showing {MAX_TASK_BUTTONS} of {len(pending)} pending tasks.")
+            pending = pending[:MAX_TASK_BUTTONS]
+        for task in pending:
+            self.add_item(TaskButton.from_task(task, db_manager))
\ No newline at end of file